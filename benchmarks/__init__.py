@@ -0,0 +1,5 @@
+"""Performance benchmarks for todo.py, run from the repository root.
+
+    python -m benchmarks.suite                 # time the core paths, print JSON
+    python -m benchmarks.storage_backends      # compare the storage backends
+"""
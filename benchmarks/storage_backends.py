@@ -0,0 +1,62 @@
+"""Compare the JSON and SQLite storage backends.
+
+Builds a synthetic workspace in a temporary directory and times, for each
+backend, how long startup takes and how long saving a single edit takes.
+
+    python -m benchmarks.storage_backends --projects 40 --todos 500
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from benchmarks.workspace import synthetic_projects
+from todo import JsonStorage, SqliteStorage, TodoManager
+
+
+def timed(fn):
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+def bench(name, make_storage, projects, edits):
+    storage = make_storage()
+    storage.save(projects)
+    storage.close()
+
+    startup = timed(lambda: TodoManager(make_storage()).close())
+
+    manager = TodoManager(make_storage())
+    rng = random.Random(1)
+    latencies = []
+    for _ in range(edits):
+        manager.project_selection = rng.randrange(len(manager.projects))
+        manager.todo_selection = rng.randrange(len(manager.projects[manager.project_selection].todos))
+        latencies.append(timed(manager.toggle_todo))
+    manager.close()
+
+    latencies.sort()
+    print(f"{name:8} startup {startup * 1000:9.1f} ms   "
+          f"save median {latencies[len(latencies) // 2] * 1000:7.3f} ms   "
+          f"p95 {latencies[int(len(latencies) * 0.95)] * 1000:7.3f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--projects', type=int, default=40)
+    parser.add_argument('--todos', type=int, default=500, help="todos per project")
+    parser.add_argument('--edits', type=int, default=200)
+    args = parser.parse_args()
+
+    projects = synthetic_projects(args.projects, args.todos)
+    print(f"{args.projects} projects x {args.todos} todos, {args.edits} edits")
+    for name, make_storage in (('json', JsonStorage), ('sqlite', SqliteStorage)):
+        with tempfile.TemporaryDirectory() as workdir:
+            os.chdir(workdir)
+            bench(name, make_storage, projects, args.edits)
+
+
+if __name__ == '__main__':
+    main()
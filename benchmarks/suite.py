@@ -0,0 +1,314 @@
+"""Time the core paths of todo.py against a synthetic workspace.
+
+Prints the results as JSON.  With --baseline the results are compared with
+an earlier run's, and the exit status is 1 if any median got slower by more
+than --tolerance.  Medians under --floor milliseconds are too noisy to judge
+and never count as regressions.
+
+    python -m benchmarks.suite --output results.json
+    python -m benchmarks.suite --baseline benchmarks/baseline.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date
+from unittest import mock
+
+import todo
+from benchmarks.workspace import WORDS, synthetic_projects
+from todo import BackgroundWriter, FilterQuery, JsonStorage, TodoManager
+
+SORT_MODES = ('description', 'due_date', 'priority')
+
+
+class FakeWindow:
+    """Stands in for a curses window, keeping what is drawn in a grid of cells.
+
+    getch() returns keys in turn and notes when it was called, so the gaps
+    between calls are the time taken to handle a key and draw the next frame.
+    """
+    def __init__(self, height, width, keys=()):
+        self.height = height
+        self.width = width
+        self.keys = iter(keys)
+        self.key_times = []
+        self.clear()
+
+    def getmaxyx(self):
+        return self.height, self.width
+
+    def addstr(self, y, x, text, attr=0):
+        if not 0 <= y < self.height or not 0 <= x < self.width:
+            raise todo.curses.error
+        text = text[:self.width - x]
+        self.cells[y][x:x + len(text)] = text
+
+    def addch(self, y, x, ch, attr=0):
+        self.addstr(y, x, ch)
+
+    def hline(self, y, x, ch, n):
+        self.addstr(y, x, ch * n)
+
+    def clear(self):
+        self.cells = [[' '] * self.width for _ in range(self.height)]
+
+    def getch(self):
+        self.key_times.append(time.perf_counter())
+        return next(self.keys)
+
+    def timeout(self, delay):
+        pass
+
+    def border(self):
+        pass
+
+    def bkgd(self, ch, attr=0):
+        pass
+
+    def clrtoeol(self):
+        pass
+
+    def noutrefresh(self):
+        pass
+
+    def refresh(self):
+        pass
+
+
+def fake_curses():
+    """Patch the curses calls main() makes so it can draw into FakeWindows"""
+    def ignore(*args):
+        pass
+    return mock.patch.multiple(
+        todo.curses, create=True,
+        start_color=ignore, curs_set=ignore, init_color=ignore, init_pair=ignore,
+        echo=ignore, noecho=ignore, doupdate=ignore,
+        color_pair=lambda n: n << 8,
+        newwin=lambda height, width, y, x: FakeWindow(height, width),
+        ACS_HLINE='-', ACS_VLINE='|')
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    fn(*args)
+    return time.perf_counter() - start
+
+
+def summarize(samples):
+    samples = sorted(samples)
+    return {
+        'runs': len(samples),
+        'median_ms': round(statistics.median(samples) * 1000, 4),
+        'min_ms': round(samples[0] * 1000, 4),
+        'p95_ms': round(samples[int(len(samples) * 0.95)] * 1000, 4),
+    }
+
+
+def render_frames(keys):
+    """Run main() on a fake 40x120 screen, returning the time each key's frame took"""
+    stdscr = FakeWindow(40, 120, list(keys) + [ord('q')])
+    with fake_curses():
+        todo.main(stdscr, JsonStorage())
+    times = stdscr.key_times
+    return [after - before for before, after in zip(times, times[1:])]
+
+
+def run_suite(projects, repeat, seed=0):
+    """Time each core path in the current directory, returning name -> summary"""
+    rng = random.Random(seed)
+    results = {}
+    JsonStorage().save(projects)
+    manager = TodoManager()
+
+    def pick_todo():
+        manager.project_selection = rng.randrange(len(manager.projects))
+        visible = manager.get_visible_todos()
+        manager.todo_selection = rng.randrange(len(visible)) if visible else 0
+
+    results['load_data'] = summarize([timed(manager.load_data) for _ in range(repeat)])
+    results['save_data'] = summarize([timed(manager.save_data) for _ in range(repeat)])
+    results['create_backup'] = summarize([timed(manager.create_backup) for _ in range(repeat)])
+
+    # First start after upgrading: plain-copy backups are moved into the store
+    data = todo.dump_projects(projects)
+    samples = []
+    for _ in range(repeat):
+        with tempfile.TemporaryDirectory() as directory:
+            for day in range(1, 4):
+                with open(os.path.join(directory, f'projects_2024010{day}_000000.json'), 'wb') as f:
+                    f.write(data)
+            start = time.perf_counter()
+            store = todo.BackupStore(directory)
+            samples.append(time.perf_counter() - start)
+            if len(store.names()) != 3:
+                raise RuntimeError("plain-copy backups were not imported")
+            store.close()
+    results['import_legacy_backups'] = summarize(samples)
+
+    samples = []
+    for i in range(repeat):
+        manager.project_selection = rng.randrange(len(manager.projects))
+        samples.append(timed(manager.add_todo, f"Benchmark todo {i}", "2025-06-01", 'high'))
+    results['add_todo'] = summarize(samples)
+
+    samples = []
+    for _ in range(repeat):
+        pick_todo()
+        samples.append(timed(manager.toggle_todo))
+    results['toggle_todo'] = summarize(samples)
+
+    # Each sample sorts a project that has not been sorted that way before
+    for mode in SORT_MODES:
+        samples = []
+        for i in range(repeat):
+            manager.project_selection = i % len(manager.projects)
+            samples.append(timed(manager.toggle_sort, mode))
+        results[f'sort_todos[{mode}]'] = summarize(samples)
+
+    results['search_index_build'] = summarize([timed(manager.search_todos, 'review')])
+    samples = []
+    for _ in range(repeat):
+        word = rng.choice(WORDS)
+        start = rng.randrange(len(word) - 2)
+        samples.append(timed(manager.search_todos, word[start:start + rng.randint(3, 5)]))
+    results['search_todos'] = summarize(samples)
+
+    # Typing a word a letter at a time, reading the first screenful after each
+    samples = []
+    for _ in range(repeat):
+        word, found = rng.choice(WORDS), None
+        for n in range(1, len(word) + 1):
+            start = time.perf_counter()
+            found = manager.search_results(word[:n], found)
+            found.page(0, 40)
+            samples.append(time.perf_counter() - start)
+    results['search_keystroke'] = summarize(samples)
+
+    # A saved filter's first screenful: priority, a due range, negation and text
+    samples = []
+    for _ in range(repeat):
+        due = date.fromordinal(rng.choice(manager.search_index.due_dates))
+        query = FilterQuery(f"p:{rng.choice(('high', 'medium', 'low'))} due<{due} "
+                            f"-done {rng.choice(WORDS)[:4]}")
+        samples.append(timed(lambda: manager.run_filter(query).page(0, 40)))
+    results['filter_query'] = summarize(samples)
+
+    results['deadline_index_build'] = summarize([timed(manager.deadlines)])
+    samples = []
+    for _ in range(repeat):
+        day = rng.choice(manager.deadline_index.dates)
+        samples.append(timed(lambda: list(manager.deadlines().due(day, day + 7))))
+    results['due_in_week'] = summarize(samples)
+
+    results['todo_columns_build'] = summarize([timed(manager.todo_columns)])
+    results['due_report'] = summarize([timed(manager.due_report, 7) for _ in range(repeat)])
+
+    samples = []
+    for _ in range(repeat):
+        pick_todo()
+        samples.append(timed(manager.save_state))
+        manager.toggle_todo()
+    results['save_state'] = summarize(samples)
+    results['undo'] = summarize([timed(manager.undo) for _ in range(repeat)])
+    results['redo'] = summarize([timed(manager.redo) for _ in range(repeat)])
+    manager.close()
+
+    # As the UI edits: through a BackgroundWriter, syncing after each key
+    manager = TodoManager(BackgroundWriter(JsonStorage()))
+    samples = []
+    for _ in range(repeat):
+        pick_todo()
+        samples.append(timed(lambda: (manager.toggle_todo(), manager.sync())))
+    results['toggle_todo[background]'] = summarize(samples)
+    manager.close()
+
+    results['render_full_frame'] = summarize(render_frames([todo.curses.KEY_RESIZE] * repeat))
+    results['render_scroll_frame'] = summarize(
+        render_frames([ord('\t')] + [todo.curses.KEY_DOWN] * repeat)[1:])
+    return results
+
+
+def compare(results, baseline, tolerance, floor):
+    """Median of each result against the baseline's, name -> comparison"""
+    comparison = {}
+    for name, result in results.items():
+        before = baseline.get('results', {}).get(name)
+        if not before:
+            continue
+        ratio = result['median_ms'] / before['median_ms'] if before['median_ms'] else 1.0
+        comparison[name] = {
+            'baseline_median_ms': before['median_ms'],
+            'ratio': round(ratio, 3),
+            'regressed': ratio > 1 + tolerance and result['median_ms'] >= floor,
+        }
+    return comparison
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--projects', type=int, default=50)
+    parser.add_argument('--todos', type=int, default=400, help="todos per project")
+    parser.add_argument('--due-spread', type=int, default=365, metavar='DAYS',
+                        help="spread of due dates around 2025-01-01")
+    parser.add_argument('--min-words', type=int, default=2, help="shortest description, in words")
+    parser.add_argument('--max-words', type=int, default=8, help="longest description, in words")
+    parser.add_argument('--repeat', type=int, default=30, help="samples per benchmark")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', metavar='FILE', help="write the JSON here instead of stdout")
+    parser.add_argument('--baseline', metavar='FILE', help="JSON from an earlier run to compare with")
+    parser.add_argument('--tolerance', type=float, default=0.5,
+                        help="slowdown allowed before a result counts as a regression (default: 0.5)")
+    parser.add_argument('--floor', type=float, default=0.05, metavar='MS',
+                        help="ignore regressions in medians shorter than this (default: 0.05)")
+    args = parser.parse_args()
+
+    workspace = {
+        'projects': args.projects,
+        'todos_per_project': args.todos,
+        'due_spread': args.due_spread,
+        'description_words': [args.min_words, args.max_words],
+        'seed': args.seed,
+    }
+    projects = synthetic_projects(args.projects, args.todos, args.seed, args.due_spread,
+                                  (args.min_words, args.max_words))
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        try:
+            results = run_suite(projects, args.repeat, args.seed)
+        finally:
+            os.chdir(cwd)
+
+    report = {
+        'python': platform.python_version(),
+        'workspace': workspace,
+        'repeat': args.repeat,
+        'results': results,
+    }
+    regressed = False
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get('workspace') != workspace:
+            print("warning: the baseline was run on a different workspace", file=sys.stderr)
+        report['comparison'] = compare(results, baseline, args.tolerance, args.floor)
+        regressed = any(c['regressed'] for c in report['comparison'].values())
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+    if regressed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
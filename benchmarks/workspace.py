@@ -0,0 +1,43 @@
+"""Synthetic workspaces for the benchmarks."""
+import random
+from datetime import date, timedelta
+
+from todo import Project, Todo
+
+WORDS = ['review', 'write', 'fix', 'plan', 'call', 'email', 'draft', 'update', 'report',
+         'budget', 'meeting', 'design', 'deploy', 'test', 'invoice', 'notes', 'release',
+         'customer', 'backlog', 'agenda', 'docs', 'migrate', 'server', 'weekly']
+
+CATEGORIES = ['work', 'home', 'errand', 'urgent', 'later']
+
+
+def synthetic_projects(project_count, todos_per_project, seed=0, due_spread=365,
+                       description_words=(2, 8), completed_ratio=0.3, due_ratio=0.6,
+                       start=date(2025, 1, 1)):
+    """Projects filled with random todos.
+
+    Due dates fall within due_spread days of start, descriptions are
+    description_words (min, max) words long after a unique "Task p-t" prefix.
+    The same arguments always give the same workspace.
+    """
+    rng = random.Random(seed)
+    projects = []
+    for p in range(project_count):
+        project = Project(f"Project {p}")
+        todos = []
+        for t in range(todos_per_project):
+            words = rng.choices(WORDS, k=rng.randint(*description_words))
+            due = None
+            if rng.random() < due_ratio:
+                due = (start + timedelta(days=rng.randint(-due_spread // 2, due_spread // 2))).isoformat()
+            todos.append(Todo(
+                f"Task {p}-{t} " + " ".join(words),
+                rng.random() < completed_ratio,
+                "2025-01-01 09:00",
+                due,
+                rng.choice(['low', 'medium', 'high']),
+                tuple(rng.sample(CATEGORIES, rng.randint(0, 2)))
+            ))
+        project.todos = todos
+        projects.append(project)
+    return projects
@@ -0,0 +1,4 @@
+"""Tests for todo.py, run from the repository root.
+
+    python -m unittest
+"""
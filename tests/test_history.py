@@ -0,0 +1,227 @@
+"""Undo, redo and sorting against the way todo.py first did them.
+
+SnapshotManager keeps the original behaviour: save_state() copies every
+project, undo and redo swap whole copies in, and every change is followed
+by a full stable sort.  Random sequences of edits, undos and redos run on it
+and on TodoManager must leave the same projects and selection after each
+step.
+"""
+import os
+import random
+import tempfile
+import unittest
+
+from todo import Project, Storage, Todo, TodoManager
+
+WORDS = ['alpha', 'Alpha', 'beta', 'gamma', 'delta']
+DATES = [None, '2025-01-01', '2025-01-02', '2025-02-01']
+PRIORITIES = ['high', 'medium', 'low']
+SORT_MODES = ['description', 'due_date', 'priority']
+
+
+class MemoryStorage(Storage):
+    """Storage that keeps nothing, so both managers start from the same projects"""
+    def __init__(self, data):
+        self.data = data
+
+    def load(self):
+        projects = []
+        for saved in self.data:
+            project = Project(saved['name'])
+            project.todos = [Todo.from_dict(todo) for todo in saved['todos']]
+            projects.append(project)
+        return projects
+
+    def save(self, projects):
+        pass
+
+    def append(self, changes):
+        pass
+
+    def backup_data(self):
+        return None
+
+
+class SnapshotManager(TodoManager):
+    """TodoManager with the original undo history and sorting"""
+    max_history = 50
+
+    def __init__(self, storage):
+        self.undo_states = []
+        self.redo_states = []
+        super().__init__(storage)
+
+    def state(self):
+        return ([(p.name, p.sort_by, p.sort_reverse, [todo.to_dict() for todo in p.todos])
+                 for p in self.projects], self.view_state())
+
+    def restore(self, state):
+        projects, view = state
+        self.projects = []
+        for name, sort_by, sort_reverse, todos in projects:
+            project = Project(name)
+            project.todos = [Todo.from_dict(todo) for todo in todos]
+            project.sort_by, project.sort_reverse = sort_by, sort_reverse
+            self.projects.append(project)
+        self.project_selection, self.todo_selection, self.show_completed = view
+
+    def save_state(self):
+        self.undo_states.append(self.state())
+        self.redo_states.clear()
+        if len(self.undo_states) > self.max_history:
+            self.undo_states.pop(0)
+
+    def undo(self):
+        if self.undo_states:
+            self.redo_states.append(self.state())
+            self.restore(self.undo_states.pop())
+
+    def redo(self):
+        if self.redo_states:
+            self.undo_states.append(self.state())
+            self.restore(self.redo_states.pop())
+
+    def sort_project(self, project_index, index=None):
+        project = self.projects[project_index]
+        project.todos.sort(key=project.sort_key, reverse=project.sort_reverse)
+
+
+class ConfirmWindow:
+    """Answers delete_project()'s prompt with 'y'"""
+    def getmaxyx(self):
+        return 40, 120
+
+    def addstr(self, *args):
+        pass
+
+    def clrtoeol(self):
+        pass
+
+    def refresh(self):
+        pass
+
+    def getch(self):
+        return ord('y')
+
+
+def random_workspace(rng):
+    return [{'name': f'P{p}', 'todos': [
+        {'description': rng.choice(WORDS), 'completed': rng.random() < 0.3,
+         'created_at': '2024-01-01 00:00', 'due_date': rng.choice(DATES),
+         'priority': rng.choice(PRIORITIES), 'categories': []}
+        for _ in range(rng.randint(0, 6))]} for p in range(rng.randint(1, 3))]
+
+
+def random_step(rng, step):
+    """An operation name and its arguments"""
+    op = rng.choice(['add', 'toggle', 'delete', 'edit', 'cycle', 'add_project',
+                     'delete_project', 'sort', 'sort', 'hide', 'select',
+                     'undo', 'undo', 'redo', 'redo'])
+    if op == 'add':
+        return op, (rng.choice(WORDS), rng.choice(DATES), rng.choice(PRIORITIES))
+    if op == 'edit':
+        return op, (rng.choice([None] + WORDS), rng.choice([None, ''] + DATES[1:]),
+                    rng.choice([None] + PRIORITIES))
+    if op == 'add_project':
+        return op, (f'N{step}',)
+    if op == 'sort':
+        return op, (rng.choice(SORT_MODES),)
+    if op == 'select':
+        return op, (rng.random(), rng.random())
+    return op, ()
+
+
+def run_step(manager, op, args):
+    # The original code indexed todos with the selection unchecked, so keep it in range
+    manager.project_selection = min(manager.project_selection, max(0, len(manager.projects) - 1))
+    if manager.projects:
+        todos = manager.projects[manager.project_selection].todos
+        manager.todo_selection = min(manager.todo_selection, max(0, len(todos) - 1))
+    if op == 'add':
+        if manager.projects:
+            manager.add_todo(*args)
+    elif op == 'toggle':
+        manager.toggle_todo()
+    elif op == 'delete':
+        manager.delete_todo()
+    elif op == 'edit':
+        manager.edit_todo(*args)
+    elif op == 'cycle':
+        manager.cycle_priority()
+    elif op == 'add_project':
+        manager.add_project(*args)
+    elif op == 'delete_project':
+        if len(manager.projects) > 1:
+            manager.delete_project(ConfirmWindow())
+    elif op == 'sort':
+        if manager.projects:
+            manager.toggle_sort(*args)
+    elif op == 'hide':
+        manager.toggle_completed_visibility()
+    elif op == 'select':
+        if manager.projects:
+            manager.project_selection = int(args[0] * len(manager.projects))
+            visible = len(manager.get_visible_todos())
+            manager.todo_selection = int(args[1] * visible) if visible else 0
+    elif op == 'undo':
+        manager.undo()
+    elif op == 'redo':
+        manager.redo()
+
+
+def outcome(manager):
+    """Projects (leaving out creation times) and selection"""
+    projects = [(p.name, p.sort_by, p.sort_reverse,
+                 [{key: value for key, value in todo.to_dict().items() if key != 'created_at'}
+                  for todo in p.todos]) for p in manager.projects]
+    return projects, manager.view_state()
+
+
+class HistoryTest(unittest.TestCase):
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.workdir = tempfile.TemporaryDirectory()
+        os.chdir(self.workdir.name)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.workdir.cleanup()
+
+    def compare(self, seed, steps=60):
+        rng = random.Random(seed)
+        data = random_workspace(rng)
+        manager = TodoManager(MemoryStorage(data))
+        reference = SnapshotManager(MemoryStorage(data))
+        done = []
+        for step in range(steps):
+            op, args = random_step(rng, step)
+            done.append(op)
+            run_step(reference, op, args)
+            run_step(manager, op, args)
+            self.assertEqual(outcome(manager), outcome(reference),
+                             f"seed {seed} after {' '.join(done[-8:])}")
+        manager.close()
+        reference.close()
+
+    def test_matches_snapshots(self):
+        for seed in range(200):
+            self.compare(seed)
+
+    def test_redo_drops_edits_made_after_undo(self):
+        # Priority changes save no undo state; the snapshot redo throws them away
+        data = [{'name': 'P0', 'todos': [
+            {'description': word, 'completed': False, 'created_at': '2024-01-01 00:00',
+             'due_date': None, 'priority': 'medium', 'categories': []} for word in WORDS]}]
+        manager = TodoManager(MemoryStorage(data))
+        reference = SnapshotManager(MemoryStorage(data))
+        for op, args in [('toggle', ()), ('toggle', ()), ('undo', ()), ('cycle', ()),
+                         ('cycle', ()), ('undo', ()), ('redo', ()), ('redo', ())]:
+            run_step(reference, op, args)
+            run_step(manager, op, args)
+            self.assertEqual(outcome(manager), outcome(reference), op)
+        manager.close()
+        reference.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
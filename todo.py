@@ -1,37 +1,212 @@
 #import needed libraries
+import time
+STARTUP_CLOCK = time.perf_counter()  # The 'import' startup phase is timed from here
 import curses
 import json
 import os
-import shutil
-from datetime import datetime, timedelta
-import copy
+import re
+import argparse
+import codecs
+import signal
+import socket
+import csv
+import hashlib
+import sys
+import sqlite3
+import threading
+import zlib
+from array import array
+from bisect import bisect_left, bisect_right, insort
+from collections import Counter, deque
+from contextlib import ExitStack, contextmanager, nullcontext
+from functools import lru_cache, wraps
+from itertools import accumulate, compress, islice, repeat
+from operator import eq, ne
+from datetime import date, datetime, timedelta
+from enum import IntEnum
 from typing import List, Set, Optional
+try:
+    import fcntl
+except ImportError:  # Windows: sessions on one workspace are not kept apart
+    fcntl = None
+
+class StartupProfile:
+    """Time spent in each phase of startup, printed by --startup-profile.
+
+    mark(phase) charges the time since the previous mark to phase; the first
+    mark is timed from when this module started importing.  Marks made after
+    finish() are ignored, so code shared with later reloads can mark freely.
+    """
+    def __init__(self, start: float):
+        self.last = start
+        self.phases = []
+        self.finished = False
+
+    def mark(self, phase: str):
+        if self.finished:
+            return
+        now = time.perf_counter()
+        self.phases.append((phase, now - self.last))
+        self.last = now
+
+    def finish(self):
+        self.finished = True
+
+    def report(self) -> str:
+        lines = [f"{'phase':14} {'ms':>9} {'total ms':>9}"]
+        total = 0.0
+        for phase, seconds in self.phases:
+            total += seconds
+            lines.append(f"{phase:14} {seconds * 1000:9.1f} {total * 1000:9.1f}")
+        return "\n".join(lines)
+
+startup_profile = StartupProfile(STARTUP_CLOCK)
+
+class LatencyStats:
+    """Rolling latency samples per operation, for the L popup and --latency-log.
+
+    Each operation keeps its last window samples, so percentiles follow how
+    the UI behaves now rather than since startup.  Writes on the background
+    threads record too, so the samples are only touched under lock.
+    """
+    def __init__(self, window: int = 1000):
+        self.window = window
+        self.samples = {}  # name -> deque of seconds
+        self.counts = Counter()
+        self.lock = threading.Lock()
+
+    def record(self, name: str, seconds: float):
+        with self.lock:
+            samples = self.samples.get(name)
+            if samples is None:
+                samples = self.samples[name] = deque(maxlen=self.window)
+            samples.append(seconds)
+            self.counts[name] += 1
+
+    def lap(self, name: str, since: float) -> float:
+        """Record the time since since under name and return the current time"""
+        now = time.perf_counter()
+        self.record(name, now - since)
+        return now
+
+    def snapshot(self):
+        """(name, count, samples) for each operation, copied while nothing records"""
+        with self.lock:
+            return [(name, self.counts[name], list(samples))
+                    for name, samples in self.samples.items()]
+
+    @staticmethod
+    def percentiles(samples, points=(50, 95, 99)):
+        ordered = sorted(samples)
+        return [ordered[min(len(ordered) - 1, len(ordered) * point // 100)] for point in points]
+
+    def summary(self, snapshot=None):
+        """(name, count, p50, p95, p99, max) rows in seconds, slowest p95 first"""
+        rows = [(name, count, *self.percentiles(samples), max(samples))
+                for name, count, samples in snapshot or self.snapshot()]
+        return sorted(rows, key=lambda row: row[3], reverse=True)
+
+    def export(self, path: str):
+        """Write the summary and the samples behind it to path as JSON, in milliseconds"""
+        snapshot = self.snapshot()
+        samples = {name: samples for name, _, samples in snapshot}
+        data = {name: {'count': count, 'p50_ms': p50 * 1000, 'p95_ms': p95 * 1000,
+                       'p99_ms': p99 * 1000, 'max_ms': longest * 1000,
+                       'samples_ms': [sample * 1000 for sample in samples[name]]}
+                for name, count, p50, p95, p99, longest in self.summary(snapshot)}
+        with open(path, 'w') as f:
+            json.dump(data, f, indent=2)
+
+latency_stats = LatencyStats()
+
+def exclusive(method):
+    """Run a TodoManager edit under TodoManager.locked()"""
+    @wraps(method)
+    def locked(self, *args, **kwargs):
+        with self.locked():
+            return method(self, *args, **kwargs)
+    return locked
+
+def timed_operation(method):
+    """Record how long each call of method takes in latency_stats"""
+    @wraps(method)
+    def timed(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            latency_stats.lap(method.__name__, start)
+    return timed
 
 class UndoManager:
+    """Undo/redo history kept as the changes made between saved states.
+
+    Each stack entry is (view, changes): the selection state at the time the
+    entry was saved and the (change, inverse) pairs applied since.  Changes
+    made after the newest entry accumulate in tail until the next save, undo
+    or redo, so memory scales with the size of each edit.
+    """
     def __init__(self, max_history: int = 50):
         self.undo_stack = []
         self.redo_stack = []
+        self.tail = []
         self.max_history = max_history
+
+    def record(self, change, inverse):
+        """Remember a change applied since the last saved state"""
+        self.tail.append((change, inverse))
     
-    def push_state(self, state):
+    def snapshot(self):
+        """Capture the history so restore() can forget what is recorded after it"""
+        return (list(self.undo_stack), list(self.redo_stack), list(self.tail),
+                [len(changes) for _, changes in self.undo_stack])
+
+    def restore(self, snapshot):
+        self.undo_stack, self.redo_stack, self.tail, lengths = snapshot
+        for (_, changes), length in zip(self.undo_stack, lengths):
+            del changes[length:]
+
+    def clear(self):
+        self.undo_stack = []
+        self.redo_stack = []
+        self.tail = []
+
+    def push_state(self, view):
         """Save current state to undo stack"""
-        self.undo_stack.append(copy.deepcopy(state))
+        if self.undo_stack:
+            self.undo_stack[-1][1].extend(self.tail)
+        self.tail = []
+        self.undo_stack.append((view, []))
         self.redo_stack.clear()  # Clear redo stack when new action is performed
         if len(self.undo_stack) > self.max_history:
             self.undo_stack.pop(0)
     
-    def undo(self, current_state) -> Optional[dict]:
-        """Undo last action"""
+    def undo(self, current_view) -> Optional[tuple]:
+        """Undo last action, returning the changes to apply and the view to restore"""
         if self.undo_stack:
-            self.redo_stack.append(copy.deepcopy(current_state))
-            return self.undo_stack.pop()
+            view, changes = self.undo_stack.pop()
+            changes.extend(self.tail)
+            if self.redo_stack:
+                # Redoing this step brings the tail back, which the next redo has to drop
+                next_view, next_changes = self.redo_stack[-1]
+                self.redo_stack[-1] = (next_view, [(inverse, change) for change, inverse
+                                                   in reversed(self.tail)] + next_changes)
+            self.tail = []
+            self.redo_stack.append((current_view, changes))
+            return [inverse for _, inverse in reversed(changes)], view
         return None
     
-    def redo(self, current_state) -> Optional[dict]:
-        """Redo last undone action"""
+    def redo(self, current_view) -> Optional[tuple]:
+        """Redo last undone action, returning the changes to apply and the view to restore"""
         if self.redo_stack:
-            self.undo_stack.append(copy.deepcopy(current_state))
-            return self.redo_stack.pop()
+            view, changes = self.redo_stack.pop()
+            # Changes made since the undo are rolled back before redoing
+            if self.undo_stack:
+                self.undo_stack[-1][1].extend(self.tail)
+            changes = [(inverse, change) for change, inverse in reversed(self.tail)] + changes
+            self.tail = []
+            self.undo_stack.append((current_view, changes))
+            return [change for change, _ in changes], view
         return None
     
 #curent themes: Nord, Atom Dark, and Matrix(dos like)
@@ -156,198 +331,2945 @@ class ThemeManager:
         else:
             self.init_longhorns_theme()
 
-class Project:
-    def __init__(self, name):
-        self.name = name
-        self.todos = []
-        self.sort_by = 'due_date'  # Changed default sort to due_date
-        self.sort_reverse = False
-        self.categories: Set[str] = set()
+class Priority(IntEnum):
+    """Todo priority; the value is its rank in priority sort order"""
+    HIGH = 0
+    MEDIUM = 1
+    LOW = 2
+
+    def __init__(self, value):
+        self.label = self.name.lower()
+
+    @classmethod
+    def parse(cls, label):
+        return PRIORITY_LABELS[label] if label else cls.MEDIUM
+
+PRIORITY_LABELS = {priority.label: priority for priority in Priority}
+
+# Sorts after every real due date
+NO_DUE_DATE = date.max.toordinal() + 1
+
+# Dates repeat a lot across todos, so conversions are memoized
+
+@lru_cache(maxsize=4096)
+def date_ordinal(text):
+    return date.fromisoformat(text).toordinal() if text else None
+
+@lru_cache(maxsize=4096)
+def minute_ordinal(text):
+    """Minutes since 0001-01-01 for a "%Y-%m-%d %H:%M" timestamp"""
+    if not text:
+        return None
+    moment = datetime.fromisoformat(text)
+    return moment.toordinal() * 1440 + moment.hour * 60 + moment.minute
+
+@lru_cache(maxsize=4096)
+def date_text(ordinal):
+    return date.fromordinal(ordinal).isoformat()
+
+@lru_cache(maxsize=4096)
+def minute_text(minutes):
+    day, minute = divmod(minutes, 1440)
+    return f"{date_text(day)} {minute // 60:02d}:{minute % 60:02d}"
+
+class Todo:
+    """A single todo.
+
+    Dates are stored as ordinal ints and priority as an interned Priority, so
+    sort keys are tuples of ints and no strings are parsed after loading.
+    Fields are read and written in their projects.json form through field(),
+    update() and to_dict().  A stored date that does not parse has no
+    ordinal; its text is kept in unparsed and shown and saved as it was.
+    """
+    __slots__ = ('description', 'completed', 'created', 'due', 'priority', 'categories',
+                 'unparsed')
+    FIELDS = ('description', 'completed', 'created_at', 'due_date', 'priority', 'categories')
+
+    def __init__(self, description, completed=False, created_at=None, due_date=None,
+                 priority=None, categories=()):
+        self.description = description
+        self.completed = bool(completed)
+        self.unparsed = None  # field -> text of dates that did not parse
+        try:
+            self.created = minute_ordinal(created_at)
+            self.due = date_ordinal(due_date)
+        except (TypeError, ValueError):
+            self.created = self.parse_date('created_at', created_at)
+            self.due = self.parse_date('due_date', due_date)
+        self.priority = Priority.parse(priority)
+        self.categories = tuple(categories)
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['description'], data.get('completed', False), data.get('created_at'),
+                   data.get('due_date'), data.get('priority'), data.get('categories', ()))
+
+    @classmethod
+    def coerce(cls, todo):
+        """Return todo as a Todo, converting it if it is a dict from a change record"""
+        return todo if isinstance(todo, cls) else cls.from_dict(todo)
+
+    def parse_date(self, key, text):
+        """Ordinal of a created_at or due_date value, or None if it does not parse"""
+        try:
+            ordinal = minute_ordinal(text) if key == 'created_at' else date_ordinal(text)
+        except (TypeError, ValueError):
+            self.unparsed = dict(self.unparsed or (), **{key: text})
+            return None
+        if self.unparsed and key in self.unparsed:
+            self.unparsed = {k: v for k, v in self.unparsed.items() if k != key} or None
+        return ordinal
+
+    @property
+    def due_date(self):
+        if self.due:
+            return date_text(self.due)
+        return self.unparsed.get('due_date') if self.unparsed else None
+
+    @property
+    def created_at(self):
+        if self.created:
+            return minute_text(self.created)
+        return self.unparsed.get('created_at') if self.unparsed else None
+
+    def field(self, key):
+        if key == 'priority':
+            return self.priority.label
+        if key == 'categories':
+            return list(self.categories)
+        return getattr(self, key)
+
+    def update(self, fields):
+        for key, value in fields.items():
+            if key == 'created_at':
+                self.created = self.parse_date(key, value)
+            elif key == 'due_date':
+                self.due = self.parse_date(key, value)
+            elif key == 'priority':
+                self.priority = Priority.parse(value)
+            elif key == 'categories':
+                self.categories = tuple(value)
+            elif key == 'completed':
+                self.completed = bool(value)
+            else:
+                self.description = value
+
+    def copy(self):
+        todo = Todo.__new__(Todo)
+        todo.description, todo.completed, todo.created = self.description, self.completed, self.created
+        todo.due, todo.priority, todo.categories = self.due, self.priority, self.categories
+        todo.unparsed = self.unparsed
+        return todo
+
+    def to_dict(self):
+        return {
+            'description': self.description,
+            'completed': self.completed,
+            'created_at': self.created_at,
+            'due_date': self.due_date,
+            'priority': self.priority.label,
+            'categories': list(self.categories)
+        }
+
+class Project:
+    def __init__(self, name):
+        self.name = name
+        self.counts_date = None
+        # Called to read the todos when they were left on disk by defer_todos()
+        self.loader = None
+        # Called with the project when its todos are next set, read or replaced
+        self.on_load = None
+        # Bumped whenever a todo is added, removed or edited, or todos replaced
+        self.version = 0
+        # (sort_by, sort_reverse) -> (version, todos in that order) for modes used
+        # earlier, replaced by {todo: number of its run of equal keys} once reused
+        self.orderings = {}
+        self.todos = []
+        self.sort_by = 'due_date'  # Changed default sort to due_date
+        self.sort_reverse = False
+        self.categories: Set[str] = set()
+        # todos is in sort order, except possibly the todo at index displaced
+        self.in_order = False
+        self.displaced = None
+
+    @property
+    def todos(self):
+        if self.loader is not None:
+            loader, self.loader = self.loader, None
+            self.todos = loader()
+        return self._todos
+
+    @todos.setter
+    def todos(self, todos):
+        self.loader = None
+        self._todos = todos
+        self.version += 1
+        self.pending_view = None
+        self.completed_count = 0
+        self.priority_counts = {}
+        self.overdue_count = 0
+        self.due_soon_count = 0
+        for todo in todos:
+            self.tally(todo, 1)
+        if self.on_load:
+            self.on_load(self)
+
+    def defer_todos(self, loader, count, completed_count, priority_counts):
+        """Leave the todos unread until first used, taking the counts as given"""
+        self.todos = []
+        self.loader = loader
+        self.deferred_count = count
+        self.completed_count = completed_count
+        self.priority_counts = priority_counts
+
+    @property
+    def todo_count(self):
+        return self.deferred_count if self.loader is not None else len(self._todos)
+
+    @property
+    def pending_count(self):
+        return self.todo_count - self.completed_count
+
+    def tally(self, todo, sign):
+        """Add (sign 1) or remove (sign -1) a todo from the aggregate counts"""
+        if todo.completed:
+            self.completed_count += sign
+        elif self.counts_date and todo.due:
+            today, soon = self.counts_date
+            if todo.due < today:
+                self.overdue_count += sign
+            elif todo.due <= soon:
+                self.due_soon_count += sign
+        self.priority_counts[todo.priority] = self.priority_counts.get(todo.priority, 0) + sign
+
+    def due_counts(self, today):
+        """Return (overdue, due within two days) among pending todos"""
+        today = today.toordinal()
+        if not self.counts_date or self.counts_date[0] != today:
+            # Counts are relative to the date, so recount when it changes
+            self.counts_date = (today, today + 2)
+            self.todos = self.todos
+        return self.overdue_count, self.due_soon_count
+
+    def pending_todos(self):
+        """Todos that are not completed, rebuilt only after the project changes"""
+        if self.pending_view is None:
+            self.pending_view = [todo for todo in self.todos if not todo.completed]
+        return self.pending_view
+
+    def sort_key(self, todo):
+        completed = todo.completed
+        if self.sort_by == 'due_date':
+            return (completed, todo.due or NO_DUE_DATE)
+        elif self.sort_by == 'description':
+            return (completed, todo.description.lower())
+        elif self.sort_by == 'priority':
+            return (completed, todo.priority)
+        else:  # created
+            return (completed, todo.created or 0)
+
+    def sort_todos(self):
+        """Fully sort todos, by this mode's last ordering if nothing changed since"""
+        mode = (self.sort_by, self.sort_reverse)
+        cached = self.orderings.get(mode)
+        if cached and cached[0] == self.version:
+            ranks = cached[1]
+            if isinstance(ranks, list):
+                # Number the runs of equal keys, so sorting by run number puts
+                # ties in their current order just as sorting by key would
+                keys = list(map(self.sort_key, ranks))
+                runs = accumulate(map(ne, keys, islice(keys, 1, None)), initial=0)
+                ranks = dict(zip(ranks, runs))
+                self.orderings[mode] = (self.version, ranks)
+            self.todos.sort(key=ranks.__getitem__)
+        else:
+            self.todos.sort(key=self.sort_key, reverse=self.sort_reverse)
+        self.pending_view = None
+        self.in_order = True
+        self.displaced = None
+
+    def can_reposition(self, index):
+        return self.in_order and self.displaced in (None, index)
+
+    def equal_run(self, key):
+        """Return the bounds of the run of todos whose sort key equals key"""
+        todos, sort_key, reverse = self.todos, self.sort_key, self.sort_reverse
+        lo, hi = 0, len(todos)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            mid_key = sort_key(todos[mid])
+            if (mid_key > key) if reverse else (mid_key < key):
+                lo = mid + 1
+            else:
+                hi = mid
+        start, hi = lo, len(todos)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            mid_key = sort_key(todos[mid])
+            if (mid_key < key) if reverse else (mid_key > key):
+                hi = mid
+            else:
+                lo = mid + 1
+        return start, lo
+
+    def reposition(self, index):
+        """Move the todo at index to its sorted place and return its new index.
+
+        Among todos with an equal key it keeps its previous relative position,
+        which is exactly where a full stable sort would put it.
+        """
+        todo = self.todos.pop(index)
+        start, end = self.equal_run(self.sort_key(todo))
+        new_index = min(max(index, start), end)
+        self.todos.insert(new_index, todo)
+        self.pending_view = None
+        self.in_order = True
+        self.displaced = None
+        return new_index
+
+    def displace(self, index):
+        """Note that the todo at index may no longer be in sort order"""
+        if self.in_order and self.displaced not in (None, index):
+            self.in_order = False
+        self.displaced = index
+
+    def insert_todo(self, index, todo):
+        if self.displaced is not None and index <= self.displaced:
+            self.displaced += 1
+        self.todos.insert(index, todo)
+        self.tally(todo, 1)
+        self.pending_view = None
+        self.version += 1
+        self.displace(index)
+
+    def remove_todo(self, index):
+        if self.displaced == index:
+            self.displaced = None
+        elif self.displaced is not None and index < self.displaced:
+            self.displaced -= 1
+        todo = self.todos.pop(index)
+        self.tally(todo, -1)
+        self.pending_view = None
+        self.version += 1
+        return todo
+
+    def update_todo(self, index, fields):
+        """Change fields of a todo, returning their old values"""
+        todo = self.todos[index]
+        old_fields = {key: todo.field(key) for key in fields}
+        self.tally(todo, -1)
+        todo.update(fields)
+        self.tally(todo, 1)
+        self.pending_view = None
+        self.version += 1
+        self.displace(index)
+        return old_fields
+
+    def move_todo(self, src, dst):
+        self.todos.insert(dst, self.todos.pop(src))
+        self.pending_view = None
+        self.in_order = False
+
+    def reorder_todos(self, start, order):
+        window = self.todos[start:start + len(order)]
+        self.todos[start:start + len(order)] = [window[i] for i in order]
+        self.pending_view = None
+        self.in_order = False
+
+    def set_sort_mode(self, sort_by, sort_reverse):
+        """Switch sort mode, keeping the current ordering for switching back later"""
+        mode = (self.sort_by, self.sort_reverse)
+        cached = self.orderings.get(mode)
+        if self.in_order and self.displaced is None and not (cached and cached[0] == self.version):
+            self.orderings[mode] = (self.version, list(self.todos))
+        self.sort_by = sort_by
+        self.sort_reverse = sort_reverse
+        self.in_order = False
+
+
+def diff_order(old, new):
+    """Describe how the order of new differs from old as a (start, order) window.
+
+    new[start + i] is old[start + order[i]] for every i; positions outside the
+    window are unchanged.  Returns None if both lists are in the same order.
+    """
+    lo, hi = 0, len(old) - 1
+    while lo <= hi and old[lo] is new[lo]:
+        lo += 1
+    if lo > hi:
+        return None
+    while old[hi] is new[hi]:
+        hi -= 1
+    positions = {id(todo): i for i, todo in enumerate(old[lo:hi + 1])}
+    return lo, [positions[id(todo)] for todo in new[lo:hi + 1]]
+
+def invert_order(order):
+    inverse = [0] * len(order)
+    for i, j in enumerate(order):
+        inverse[j] = i
+    return inverse
+
+def apply_change(projects, change):
+    """Apply a single change record to a list of projects, returning its inverse"""
+    op = change['op']
+    if op == 'insert_project':
+        project = Project(change['name'])
+        project.todos = [Todo.coerce(todo) for todo in change.get('todos', [])]
+        project.sort_by = change.get('sort_by', project.sort_by)
+        project.sort_reverse = change.get('sort_reverse', project.sort_reverse)
+        project.categories = set(change.get('categories', []))
+        projects.insert(change['project'], project)
+        return {'op': 'remove_project', 'project': change['project']}
+    if op == 'remove_project':
+        project = projects.pop(change['project'])
+        return {'op': 'insert_project', 'project': change['project'], 'name': project.name,
+                'todos': project.todos, 'sort_by': project.sort_by,
+                'sort_reverse': project.sort_reverse, 'categories': list(project.categories)}
+    if op == 'replace_projects':
+        previous = list(projects)
+        projects[:] = change['projects']
+        return {'op': 'replace_projects', 'projects': previous}
+
+    project = projects[change['project']]
+    if op == 'insert_todo':
+        project.insert_todo(change['index'], Todo.coerce(change['todo']))
+        return {'op': 'remove_todo', 'project': change['project'], 'index': change['index']}
+    elif op == 'remove_todo':
+        todo = project.remove_todo(change['index'])
+        return {'op': 'insert_todo', 'project': change['project'], 'index': change['index'],
+                'todo': todo}
+    elif op == 'update_todo':
+        fields = dict(change['fields'])
+        for key in change.get('unset', ()):
+            fields[key] = None  # Journals from before Todo records could drop a field
+        old_fields = project.update_todo(change['index'], fields)
+        return {'op': 'update_todo', 'project': change['project'], 'index': change['index'],
+                'fields': old_fields}
+    elif op == 'move':
+        project.move_todo(change['from'], change['to'])
+        return {'op': 'move', 'project': change['project'], 'from': change['to'],
+                'to': change['from']}
+    elif op == 'reorder':
+        project.reorder_todos(change['start'], change['order'])
+        return {'op': 'reorder', 'project': change['project'], 'start': change['start'],
+                'order': invert_order(change['order'])}
+    elif op == 'sort_mode':
+        inverse = {'op': 'sort_mode', 'project': change['project'],
+                   'sort_by': project.sort_by, 'sort_reverse': project.sort_reverse}
+        project.set_sort_mode(change['sort_by'], change['sort_reverse'])
+        return inverse
+    else:
+        raise ValueError(f"Unknown change: {op}")
+
+
+def file_identity(path):
+    """(device, inode) of path, or None if it does not exist"""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_dev, stat.st_ino
+
+class ChangeJournal:
+    """Append-only log of the changes made since projects.json was last written.
+
+    Each line holds one record: a CRC32 of the payload followed by the JSON
+    payload.  A record that was only partly written when the process died fails
+    the checksum (or lacks its newline) and is dropped along with anything after it.
+
+    Records are numbered across sessions and snapshots: when the journal is
+    emptied it is replaced by a file holding one base record, which carries
+    the number of the last record folded into the snapshot.  offset is how
+    much of the file this session has read or written, so read_new() can
+    pick up what other sessions appended.
+    """
+    def __init__(self, path: str = 'projects.journal', max_records: int = 500):
+        self.path = path
+        self.max_records = max_records
+        self.record_count = 0
+        self.seq = 0
+        self.session = os.urandom(4).hex()
+        self.offset = 0
+        self.identity = None  # file_identity() of the file offset refers to
+        self._file = None
+
+    @staticmethod
+    def read_records(path, start: int = 0):
+        """Return (records, valid_length) for a journal file, reading from byte start"""
+        try:
+            with open(path, 'rb') as f:
+                f.seek(start)
+                data = f.read()
+        except FileNotFoundError:
+            return [], 0
+
+        records = []
+        pos = 0
+        while pos < len(data):
+            end = data.find(b'\n', pos)
+            if end == -1:
+                break  # Torn trailing record
+            try:
+                checksum, payload = data[pos:end].split(b' ', 1)
+                if int(checksum, 16) != zlib.crc32(payload):
+                    break
+                records.append(json.loads(payload))
+            except ValueError:
+                break
+            pos = end + 1
+        return records, start + pos
+
+    def rotated_paths(self):
+        """Journals that were handed to a compaction, keyed by the snapshot CRC they apply to"""
+        directory = os.path.dirname(self.path) or '.'
+        prefix = os.path.basename(self.path) + '.'
+        paths = {}
+        for name in os.listdir(directory):
+            suffix = name[len(prefix):]
+            if name.startswith(prefix) and len(suffix) == 8:
+                try:
+                    paths[int(suffix, 16)] = os.path.join(directory, name)
+                except ValueError:
+                    pass
+        return paths
+
+    def replay(self, projects, snapshot_crc, after_seq: int = 0):
+        """Apply journaled changes on top of the snapshot with the given CRC.
+
+        Records numbered after_seq or lower are already in the snapshot and
+        are skipped.  Returns the paths of rotated journals that had to be
+        replayed because their compaction never finished.
+        """
+        unfinished = []
+        for crc, path in self.rotated_paths().items():
+            if crc == snapshot_crc:
+                for record in self.read_records(path)[0]:
+                    for change in record['changes']:
+                        apply_change(projects, change)
+                    self.seq = record['seq']
+                unfinished.append(path)
+            else:
+                os.remove(path)  # Already folded into the snapshot
+
+        records, valid_length = self.read_records(self.path)
+        for record in records:
+            if record['seq'] > after_seq:
+                for change in record['changes']:
+                    apply_change(projects, change)
+            self.seq = record['seq']
+        self.record_count = sum(1 for record in records if not record.get('base'))
+        self.drop_torn_tail(valid_length)
+        self.identity = file_identity(self.path)
+        self.offset = valid_length
+        return unfinished
+
+    def drop_torn_tail(self, valid_length):
+        """Cut off a partly written record so new records are not appended after garbage"""
+        if os.path.exists(self.path) and os.path.getsize(self.path) > valid_length:
+            with open(self.path, 'r+b') as f:
+                f.truncate(valid_length)
+
+    def encode(self, record) -> bytes:
+        record['session'] = self.session
+        payload = json.dumps(record, separators=(',', ':'), default=Todo.to_dict).encode('utf-8')
+        return b'%08x %s\n' % (zlib.crc32(payload), payload)
+
+    def append(self, changes):
+        """Durably append one record holding the given changes"""
+        self.seq += 1
+        line = self.encode({'seq': self.seq, 'changes': changes})
+        if self._file is None:
+            self._file = open(self.path, 'ab')
+            stat = os.fstat(self._file.fileno())
+            if (stat.st_dev, stat.st_ino) != self.identity:
+                self.identity, self.offset = (stat.st_dev, stat.st_ino), stat.st_size
+        self._file.write(line)
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self.offset += len(line)
+        self.record_count += 1
+
+    def changed(self) -> bool:
+        """Whether the file was appended to or replaced since this journal last touched it"""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return self.identity is not None
+        return (stat.st_dev, stat.st_ino) != self.identity or stat.st_size != self.offset
+
+    def read_new(self):
+        """Records other sessions appended since this journal last read or wrote the file.
+
+        Returns None if records this session never saw were folded into the
+        snapshot, so the only way to catch up is to load it again.  Call with
+        the workspace locked.
+        """
+        identity = file_identity(self.path)
+        if identity != self.identity:
+            self.close()
+            self.identity, self.offset = identity, 0
+        if identity is None:
+            return []
+        records, valid_length = self.read_records(self.path, self.offset)
+        self.drop_torn_tail(valid_length)
+        self.offset = valid_length
+        new = []
+        for record in records:
+            if record['seq'] <= self.seq:
+                continue
+            if record.get('base') or record['seq'] != self.seq + 1:
+                return None
+            new.append(record)
+            self.seq = record['seq']
+            self.record_count += 1
+        return new
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def rotate(self, snapshot_crc):
+        """Move the journal aside for compaction and start a fresh one"""
+        self.close()
+        rotated = f"{self.path}.{snapshot_crc:08x}"
+        os.replace(self.path, rotated)
+        self.start_file()
+        return rotated
+
+    def truncate(self):
+        """Discard all records once their changes are in the snapshot"""
+        self.close()
+        self.start_file()
+
+    def start_file(self):
+        """Replace the journal with one holding only the base record for the current seq"""
+        line = self.encode({'seq': self.seq, 'base': True, 'changes': []})
+        temp_file = self.path + '.tmp'
+        with open(temp_file, 'wb') as f:
+            f.write(line)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_file, self.path)
+        self.identity = file_identity(self.path)
+        self.offset = len(line)
+        self.record_count = 0
+
+
+class BackupStore:
+    """Content-addressed store of projects.json restore points.
+
+    A snapshot is cut into chunks at todo boundaries, choosing cut points from
+    the content itself so an edit only changes the chunks around it.  Chunks
+    are zlib-compressed and stored once under their SHA-1, each backup is a
+    recipe (the list of its chunk hashes) stored the same way, and
+    manifest.json lists the backups from oldest to newest.
+
+    Every session on a workspace shares the directory, so the store is
+    used under manifest.lock and the manifest read again each time.
+    """
+    def __init__(self, directory: str, max_backups: int = 200, gc_batch: int = 20,
+                 cut_divisor: int = 64, max_chunk: int = 65536):
+        self.directory = directory
+        self.objects_dir = os.path.join(directory, 'objects')
+        self.manifest_path = os.path.join(directory, 'manifest.json')
+        self.max_backups = max_backups
+        self.gc_batch = gc_batch
+        self.cut_divisor = cut_divisor
+        self.max_chunk = max_chunk
+        self.lock = FileLock(os.path.join(directory, 'manifest.lock'))
+        with self.lock:
+            self.backups = self.load_manifest()
+
+    def load_manifest(self):
+        try:
+            with open(self.manifest_path, 'r') as f:
+                return json.load(f)['backups']
+        except FileNotFoundError:
+            pass
+
+        # Import plain-copy backups left by older versions
+        # Called under the lock, so store() rather than add(), which would load again
+        self.backups = []
+        legacy = sorted(f for f in os.listdir(self.directory) if f.startswith('projects_'))
+        for name in legacy:
+            with open(os.path.join(self.directory, name), 'rb') as f:
+                data = f.read()
+            self.store(name, self.split(data), len(data))
+        self.save_manifest()
+        for name in legacy:
+            os.remove(os.path.join(self.directory, name))
+        return self.backups
+
+    def save_manifest(self):
+        temp_path = self.manifest_path + '.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump({'backups': self.backups}, f)
+        os.replace(temp_path, self.manifest_path)
+
+    def split(self, data: bytes):
+        """Split a snapshot into chunks, cutting only between todos"""
+        chunks = []
+        start = previous = 0
+        pos = data.find(b'}, {')
+        while pos != -1:
+            end = pos + 1
+            # Cut after roughly one in cut_divisor todos, decided by the todo's own bytes
+            if (zlib.crc32(data[previous:end]) % self.cut_divisor == 0
+                    or end - start >= self.max_chunk):
+                chunks.append(data[start:end])
+                start = end
+            previous = end
+            pos = data.find(b'}, {', end)
+        chunks.append(data[start:])
+        return chunks
+
+    def object_path(self, digest: str):
+        return os.path.join(self.objects_dir, digest[:2], digest[2:])
+
+    def put(self, data: bytes) -> str:
+        """Store an object unless it is already present, returning its hash"""
+        digest = hashlib.sha1(data).hexdigest()
+        path = self.object_path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            temp_path = path + '.tmp'
+            with open(temp_path, 'wb') as f:
+                f.write(zlib.compress(data))
+            os.replace(temp_path, path)
+        return digest
+
+    def get(self, digest: str) -> bytes:
+        with open(self.object_path(digest), 'rb') as f:
+            return zlib.decompress(f.read())
+
+    def add(self, name: str, data: bytes):
+        """Record a restore point, replacing any existing one with the same name"""
+        chunks = self.split(data)
+        # Held from the first object on, so another session's prune() cannot take it away
+        with self.lock:
+            self.backups = self.load_manifest()
+            self.store(name, chunks, len(data))
+            self.save_manifest()
+
+    def store(self, name: str, chunks, size: int):
+        """Put a backup's chunks and list it in self.backups; the caller holds the lock"""
+        recipe = [self.put(chunk) for chunk in chunks]
+        entry = {'name': name, 'recipe': self.put(json.dumps(recipe).encode('utf-8')),
+                 'size': size}
+        self.backups = [b for b in self.backups if b['name'] != name] + [entry]
+        if len(self.backups) > self.max_backups + self.gc_batch:
+            self.prune()
+
+    def read(self, name: str) -> Optional[bytes]:
+        with self.lock:
+            self.backups = self.load_manifest()
+            for entry in self.backups:
+                if entry['name'] == name:
+                    recipe = json.loads(self.get(entry['recipe']))
+                    return b''.join(self.get(digest) for digest in recipe)
+        return None
+
+    def names(self):
+        with self.lock:
+            self.backups = self.load_manifest()
+        return [entry['name'] for entry in self.backups]
+
+    def close(self):
+        self.lock.close()
+
+    def prune(self):
+        """Drop the oldest restore points and delete objects no longer referenced"""
+        self.backups = self.backups[-self.max_backups:]
+        live = set()
+        for entry in self.backups:
+            live.add(entry['recipe'])
+            live.update(json.loads(self.get(entry['recipe'])))
+        for prefix in os.listdir(self.objects_dir):
+            for rest in os.listdir(os.path.join(self.objects_dir, prefix)):
+                if prefix + rest not in live:
+                    os.remove(os.path.join(self.objects_dir, prefix, rest))
+
+
+def parse_projects(data):
+    """Build projects from the list stored in projects.json"""
+    projects = [Project(p['name']) for p in data]
+    for proj, saved_proj in zip(projects, data):
+        proj.todos = [Todo.from_dict(todo) for todo in saved_proj['todos']]
+    return projects
+
+def dump_projects(projects) -> bytes:
+    """Serialize projects in the projects.json format"""
+    return json.dumps([{'name': p.name, 'todos': [todo.to_dict() for todo in p.todos]}
+                       for p in projects]).encode('utf-8')
+
+class JsonStream:
+    """Decodes JSON from a binary file one value at a time, a chunk at a time.
+
+    Only the unread rest of the current chunk is held as text, so large files
+    can be read without holding all of their text.  crc covers the bytes read
+    so far; progress, if given, is called with (bytes read, file size) after
+    each chunk.
+    """
+    decoder = json.JSONDecoder()
+
+    def __init__(self, f, chunk_size: int = 1 << 20, progress=None):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.progress = progress
+        self.size = os.fstat(f.fileno()).st_size
+        self.utf8 = codecs.getincrementaldecoder('utf-8')()
+        self.text = ''
+        self.pos = 0
+        self.bytes_read = 0
+        self.crc = 0
+
+    def fill(self) -> bool:
+        """Append the next chunk to the unread text, returning False at the end of the file"""
+        raw = self.f.read(self.chunk_size)
+        self.bytes_read += len(raw)
+        self.crc = zlib.crc32(raw, self.crc)
+        self.text = self.text[self.pos:] + self.utf8.decode(raw, final=not raw)
+        self.pos = 0
+        if raw and self.progress:
+            self.progress(self.bytes_read, self.size)
+        return bool(raw)
+
+    def peek(self) -> str:
+        """Skip whitespace and return the next character, or '' at the end of the file"""
+        while True:
+            self.pos = json.decoder.WHITESPACE.match(self.text, self.pos).end()
+            if self.pos < len(self.text) or not self.fill():
+                return self.text[self.pos:self.pos + 1]
+
+    def expect(self, char: str):
+        if self.peek() != char:
+            raise json.JSONDecodeError(f"Expecting {char!r}", self.text, self.pos)
+        self.pos += 1
+
+    def value(self):
+        """Decode the next value, reading on until all of it is in memory"""
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.text, self.pos)
+            except json.JSONDecodeError:
+                if self.fill():
+                    continue
+                raise
+            if (isinstance(value, (int, float)) and not self.text[end:].lstrip('0123456789.eE+-')
+                    and self.fill()):
+                continue  # The number may go on in the next chunk
+            self.pos = end
+            return value
+
+    def items(self, open_char: str, close_char: str):
+        """Step through an array or object, yielding with the stream at each element"""
+        self.expect(open_char)
+        if self.peek() == close_char:
+            self.pos += 1
+            return
+        while True:
+            yield
+            char = self.peek()
+            self.pos += 1
+            if char == close_char:
+                return
+            if char != ',':
+                raise json.JSONDecodeError("Expecting ',' delimiter", self.text, self.pos - 1)
+
+def stream_projects(stream: JsonStream):
+    """Build projects from projects.json as it is read, without its full object graph"""
+    projects = []
+    for _ in stream.items('[', ']'):
+        fields = {}
+        todos = []
+        for _ in stream.items('{', '}'):
+            key = stream.value()
+            stream.expect(':')
+            if key == 'todos':
+                todos = [Todo.from_dict(stream.value()) for _ in stream.items('[', ']')]
+            else:
+                fields[key] = stream.value()
+        project = Project(fields['name'])
+        project.todos = todos
+        projects.append(project)
+    if stream.peek():
+        raise json.JSONDecodeError("Extra data", stream.text, stream.pos)
+    return projects
+
+
+class FileLock:
+    """Advisory lock on a file, shared by every session on a workspace.
+
+    The lock belongs to the process rather than a thread: the threads of one
+    session already keep out of each other's way, and a compaction thread has
+    to carry on with a lock the appending thread took.  It is taken by the
+    first acquire() and dropped by the matching last release().
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self.depth = 0
+        self.mutex = threading.Lock()
+        self._file = None
+
+    def acquire(self):
+        with self.mutex:
+            if self.depth == 0:
+                if self._file is None:
+                    self._file = open(self.path, 'ab')
+                if fcntl:
+                    fcntl.flock(self._file.fileno(), fcntl.LOCK_EX)
+            self.depth += 1
+
+    def release(self):
+        with self.mutex:
+            self.depth -= 1
+            if self.depth == 0 and fcntl:
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+    def close(self):
+        if self._file is not None and self.depth == 0:
+            self._file.close()
+            self._file = None
+
+def file_crc(path: str) -> int:
+    crc = 0
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            crc = zlib.crc32(chunk, crc)
+    return crc
+
+
+class Storage:
+    """Interface of the storage backends.
+
+    load() returns the saved projects, save() replaces them, append() writes
+    change records applied since and backup_data() returns the saved
+    projects in projects.json form.  backup, if set, is called before a
+    backend replaces its saved state on its own initiative.  progress, if
+    set, is called with (done, total) while load() reads a large file.
+
+    Backends that several sessions can share hold lock() while writing and
+    return other sessions' changes from poll().  A session edits by taking
+    lock(), applying poll() and only then making and writing its change.
+    """
+    backup = None
+    progress = None
+
+    def lock(self):
+        """Context manager keeping other sessions from writing"""
+        return nullcontext()
+
+    def poll(self):
+        """Changes other sessions have written since the last poll, or None to reload"""
+        return []
+
+    def defer(self, fn):
+        """Call fn once everything queued so far has been written"""
+        fn()
+
+    def flush(self):
+        """Block until everything queued so far has been written"""
+
+    def close(self):
+        pass
+
+
+class JsonStorage(Storage):
+    """projects.json snapshot plus a ChangeJournal of the changes made since.
+
+    The journal is folded into the snapshot on a background thread once it
+    reaches max_records.  If backup is set it is called before the snapshot
+    is replaced by a compaction.
+
+    Sessions on the same files take turns through projects.json.lock and
+    see each other's changes by reading the journal past the point they got
+    to; poll() costs one stat() while nobody else is writing.
+    """
+    def __init__(self, data_file: str = 'projects.json', journal_file: str = 'projects.journal'):
+        self.data_file = data_file
+        self.journal = ChangeJournal(journal_file)
+        self.file_lock = FileLock(data_file + '.lock')
+        self.snapshot_crc = 0
+        self.compaction_thread = None
+        self.backup = None
+        self.incoming = []  # Other sessions' changes read but not yet polled
+        self.stale = False  # Set when they can only be had by loading again
+
+    def read_snapshot(self, progress=None):
+        """Read projects.json, returning the projects and the CRC of the file"""
+        try:
+            f = open(self.data_file, 'rb')
+        except FileNotFoundError:
+            return [Project("Default")], 0
+        with f:
+            stream = JsonStream(f, progress=progress)
+            projects = stream_projects(stream)
+        startup_profile.mark('parse')
+        return projects, stream.crc
+
+    def write_snapshot(self, projects):
+        """Atomically replace projects.json, returning the CRC of what was written"""
+        raw = dump_projects(projects)
+        temp_file = self.data_file + '.tmp'
+        with open(temp_file, 'wb') as f:
+            f.write(raw)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_file, self.data_file)
+        return zlib.crc32(raw)
+
+    def load(self):
+        """Load the last snapshot and replay the journal on top of it"""
+        self.wait_for_compaction()
+        with self.file_lock:
+            projects, self.snapshot_crc = self.read_snapshot(self.progress)
+            self.journal.close()
+            self.journal.seq = 0
+            unfinished = self.journal.replay(projects, self.snapshot_crc)
+            self.incoming, self.stale = [], False
+            if unfinished:
+                # Finish the interrupted compaction before a new one reuses the name
+                self.save(projects)
+                for path in unfinished:
+                    os.remove(path)
+        return projects
+
+    def save(self, projects):
+        """Write every project to projects.json and empty the journal"""
+        self.wait_for_compaction()
+        with self.file_lock:
+            self.snapshot_crc = self.write_snapshot(projects)
+            self.journal.truncate()
+
+    def append(self, changes):
+        """Journal changes, compacting the journal when it grows too long"""
+        with self.file_lock:
+            self.catch_up()
+            self.journal.append(changes)
+            if self.journal.record_count >= self.journal.max_records:
+                self.start_compaction()
+
+    def lock(self):
+        return self.file_lock
+
+    def catch_up(self):
+        """Read what other sessions journaled since this one last looked (hold the lock)"""
+        if not self.journal.changed():
+            return
+        identity = self.journal.identity
+        records = self.journal.read_new()
+        if records is None:
+            self.stale = True
+            return
+        if self.journal.identity != identity and os.path.exists(self.data_file):
+            # Another session rewrote the snapshot; later compactions start from it
+            self.snapshot_crc = file_crc(self.data_file)
+        for record in records:
+            self.incoming.extend(record['changes'])
+
+    def poll(self):
+        if not self.incoming and not self.stale and not self.journal.changed():
+            return []
+        with self.file_lock:
+            self.catch_up()
+            if self.stale:
+                return None
+            incoming, self.incoming = self.incoming, []
+        return incoming
+
+    def backup_data(self) -> Optional[bytes]:
+        """The projects as they stand: projects.json with the journal applied"""
+        with self.file_lock:
+            try:
+                with open(self.data_file, 'rb') as f:
+                    raw = f.read()
+            except FileNotFoundError:
+                raw = None
+            # A compaction may still be folding a rotated journal into this snapshot
+            rotated = self.journal.rotated_paths().get(zlib.crc32(raw)) if raw else None
+            records = ChangeJournal.read_records(rotated)[0] if rotated else []
+            records += ChangeJournal.read_records(self.journal.path)[0]
+        changes = [change for record in records for change in record['changes']]
+        if not changes:
+            return raw
+        projects = parse_projects(json.loads(raw)) if raw else [Project("Default")]
+        for change in changes:
+            apply_change(projects, change)
+        return dump_projects(projects)
+
+    def start_compaction(self):
+        """Fold the journal into projects.json on a background thread"""
+        if self.compaction_thread and self.compaction_thread.is_alive():
+            return
+        rotated = self.journal.rotate(self.snapshot_crc)
+        self.file_lock.acquire()  # Until the snapshot is written; released by compact()
+        self.compaction_thread = threading.Thread(target=self.compact, args=(rotated,))
+        self.compaction_thread.start()
+
+    def compact(self, rotated):
+        try:
+            projects, crc = self.read_snapshot()
+            for record in ChangeJournal.read_records(rotated)[0]:
+                for change in record['changes']:
+                    apply_change(projects, change)
+            if self.backup:
+                self.backup()
+            self.snapshot_crc = self.write_snapshot(projects)
+            os.remove(rotated)
+        finally:
+            self.file_lock.release()
+
+    def wait_for_compaction(self):
+        if self.compaction_thread:
+            self.compaction_thread.join()
+            self.compaction_thread = None
+
+    def close(self):
+        self.wait_for_compaction()
+        self.journal.close()
+        self.file_lock.close()
+
+
+def position_between(positions, index):
+    """Position for a row inserted at index, or None if there is no room left"""
+    before = positions[index - 1] if index > 0 else None
+    after = positions[index] if index < len(positions) else None
+    if before is None:
+        return 0.0 if after is None else after - 1.0
+    if after is None:
+        return before + 1.0
+    middle = (before + after) / 2
+    return middle if before < middle < after else None
+
+class SqliteStorage(Storage):
+    """Projects and todos stored as rows in a SQLite database.
+
+    Each change record becomes a few single-row statements, run in one
+    transaction per commit.  Order is kept in a REAL position column: a
+    todo inserted or moved between two others takes the midpoint of their
+    positions, so placing one todo is one UPDATE.  The storage mirrors the
+    row ids and positions of every project so change records, which address
+    todos by index, can be mapped to rows.
+    """
+    SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS projects (
+            id INTEGER PRIMARY KEY,
+            position REAL NOT NULL,
+            name TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS todos (
+            id INTEGER PRIMARY KEY,
+            project_id INTEGER NOT NULL REFERENCES projects(id),
+            position REAL NOT NULL,
+            description TEXT NOT NULL,
+            completed INTEGER NOT NULL,
+            created_at TEXT,
+            due_date TEXT,
+            priority TEXT,
+            categories TEXT NOT NULL DEFAULT '[]'
+        );
+        CREATE INDEX IF NOT EXISTS todos_by_project ON todos(project_id, position);
+        CREATE INDEX IF NOT EXISTS todos_by_due_date ON todos(due_date);
+        CREATE INDEX IF NOT EXISTS todos_by_priority ON todos(priority);
+        CREATE INDEX IF NOT EXISTS todos_by_completed ON todos(completed);
+    '''
+    TODO_COLUMNS = Todo.FIELDS
+
+    def __init__(self, path: str = 'todo.db'):
+        self.path = path
+        self.backup = None
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(self.SCHEMA)
+        self.project_rows = []      # project row ids in project order
+        self.project_positions = []
+        self.todo_rows = []         # per project, todo row ids in todo order
+        self.todo_positions = []
+
+    @staticmethod
+    def column_value(key, value):
+        if key == 'completed':
+            return int(value)
+        if key == 'categories':
+            return json.dumps(value)
+        return value
+
+    def todo_values(self, todo):
+        todo = Todo.coerce(todo)
+        return tuple(self.column_value(key, todo.field(key)) for key in self.TODO_COLUMNS)
+
+    def read_projects(self):
+        """Read every project, returning them with their row ids and positions"""
+        projects, project_rows, project_positions = [], [], []
+        index = {}
+        for row_id, position, name in self.conn.execute(
+                'SELECT id, position, name FROM projects ORDER BY position'):
+            index[row_id] = len(projects)
+            projects.append(Project(name))
+            project_rows.append(row_id)
+            project_positions.append(position)
+
+        todos = [[] for _ in projects]
+        todo_rows = [[] for _ in projects]
+        todo_positions = [[] for _ in projects]
+        for row in self.conn.execute(
+                'SELECT project_id, id, position, description, completed, created_at, '
+                'due_date, priority, categories FROM todos ORDER BY project_id, position'):
+            i = index[row[0]]
+            todo_rows[i].append(row[1])
+            todo_positions[i].append(row[2])
+            todos[i].append(Todo(row[3], row[4], row[5], row[6], row[7], json.loads(row[8])))
+        for project, project_todos in zip(projects, todos):
+            project.todos = project_todos
+        return projects, (project_rows, project_positions, todo_rows, todo_positions)
+
+    def load(self):
+        projects, mirror = self.read_projects()
+        if not projects:
+            projects = [Project("Default")]
+            self.save(projects)
+        else:
+            self.project_rows, self.project_positions, self.todo_rows, self.todo_positions = mirror
+        return projects
+
+    def save(self, projects):
+        """Replace everything in the database with projects"""
+        with self.conn:
+            self.conn.execute('DELETE FROM todos')
+            self.conn.execute('DELETE FROM projects')
+            self.project_rows, self.project_positions = [], []
+            self.todo_rows, self.todo_positions = [], []
+            for project in projects:
+                self.insert_project(len(self.project_rows), project.name, project.todos)
+
+    def backup_data(self) -> Optional[bytes]:
+        return dump_projects(self.read_projects()[0])
+
+    def append(self, changes):
+        """Write applied changes to the database in one transaction"""
+        with self.conn:
+            for change in changes:
+                self.apply(change)
+
+    def insert_project(self, index, name, todos):
+        position = position_between(self.project_positions, index)
+        if position is None:
+            self.renumber_projects()
+            position = position_between(self.project_positions, index)
+        row_id = self.conn.execute('INSERT INTO projects (position, name) VALUES (?, ?)',
+                                   (position, name)).lastrowid
+        self.project_rows.insert(index, row_id)
+        self.project_positions.insert(index, position)
+        self.todo_rows.insert(index, [])
+        self.todo_positions.insert(index, [])
+        for todo in todos:
+            self.insert_todo(index, len(self.todo_rows[index]), todo)
+
+    def insert_todo(self, project, index, todo):
+        position = self.todo_position(project, index)
+        row_id = self.conn.execute(
+            'INSERT INTO todos (project_id, position, description, completed, created_at, '
+            'due_date, priority, categories) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+            (self.project_rows[project], position) + self.todo_values(todo)).lastrowid
+        self.todo_rows[project].insert(index, row_id)
+        self.todo_positions[project].insert(index, position)
+
+    def todo_position(self, project, index):
+        position = position_between(self.todo_positions[project], index)
+        if position is None:
+            self.renumber_todos(project)
+            position = position_between(self.todo_positions[project], index)
+        return position
+
+    def renumber_projects(self):
+        self.project_positions = [float(i) for i in range(len(self.project_rows))]
+        self.conn.executemany('UPDATE projects SET position = ? WHERE id = ?',
+                              zip(self.project_positions, self.project_rows))
+
+    def renumber_todos(self, project):
+        """Spread positions out again once repeated midpoints run out of precision"""
+        self.todo_positions[project] = [float(i) for i in range(len(self.todo_rows[project]))]
+        self.conn.executemany('UPDATE todos SET position = ? WHERE id = ?',
+                              zip(self.todo_positions[project], self.todo_rows[project]))
+
+    def apply(self, change):
+        op = change['op']
+        if op == 'insert_project':
+            self.insert_project(change['project'], change['name'], change.get('todos', []))
+            return
+        if op == 'remove_project':
+            row_id = self.project_rows.pop(change['project'])
+            self.project_positions.pop(change['project'])
+            self.todo_rows.pop(change['project'])
+            self.todo_positions.pop(change['project'])
+            self.conn.execute('DELETE FROM todos WHERE project_id = ?', (row_id,))
+            self.conn.execute('DELETE FROM projects WHERE id = ?', (row_id,))
+            return
+
+        project = change['project']
+        rows, positions = self.todo_rows[project], self.todo_positions[project]
+        if op == 'insert_todo':
+            self.insert_todo(project, change['index'], change['todo'])
+        elif op == 'remove_todo':
+            positions.pop(change['index'])
+            self.conn.execute('DELETE FROM todos WHERE id = ?', (rows.pop(change['index']),))
+        elif op == 'update_todo':
+            columns = [key for key in change['fields'] if key in self.TODO_COLUMNS]
+            values = [self.column_value(key, change['fields'][key]) for key in columns]
+            for key in change.get('unset', []):
+                if key in self.TODO_COLUMNS:
+                    columns.append(key)
+                    values.append(None)
+            if columns:
+                assignments = ', '.join(f'{column} = ?' for column in columns)
+                self.conn.execute(f'UPDATE todos SET {assignments} WHERE id = ?',
+                                  values + [rows[change['index']]])
+        elif op == 'move':
+            row_id = rows.pop(change['from'])
+            positions.pop(change['from'])
+            position = self.todo_position(project, change['to'])
+            rows.insert(change['to'], row_id)
+            positions.insert(change['to'], position)
+            self.conn.execute('UPDATE todos SET position = ? WHERE id = ?', (position, row_id))
+        elif op == 'reorder':
+            start, order = change['start'], change['order']
+            window = rows[start:start + len(order)]
+            for k, i in enumerate(order):
+                if k != i:
+                    self.conn.execute('UPDATE todos SET position = ? WHERE id = ?',
+                                      (positions[start + k], window[i]))
+            rows[start:start + len(order)] = [window[i] for i in order]
+
+    def close(self):
+        self.conn.close()
+
+class Shard:
+    """Reads the todos of one project from its shard file"""
+    def __init__(self, directory, name):
+        self.directory = directory
+        self.name = name
+
+    def read(self) -> bytes:
+        with open(os.path.join(self.directory, self.name), 'rb') as f:
+            return f.read()
+
+    def __call__(self):
+        return [Todo.from_dict(todo) for todo in json.loads(self.read())]
+
+class ShardedStorage(Storage):
+    """A directory holding an index file and one shard file per project.
+
+    index.json lists every project's name, shard file and todo counts.  A
+    shard holds one project's todos and is named after a hash of its
+    contents, so an unchanged project keeps its file and a new index can be
+    written before old shards are deleted.  Loaded projects read their
+    shard only when their todos are first used.  Changes go to a journal,
+    as with JsonStorage, and compaction rewrites only the shards they touch.
+    """
+    def __init__(self, directory: str = 'projects', max_records: int = 500):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.index_file = os.path.join(directory, 'index.json')
+        self.journal = ChangeJournal(os.path.join(directory, 'journal'), max_records)
+        self.backup = None
+
+    def read_index(self):
+        """Projects as of the last index, with their todos left in the shards"""
+        try:
+            with open(self.index_file, 'rb') as f:
+                index = json.loads(f.read())
+        except FileNotFoundError:
+            return [Project("Default")], 0
+        projects = []
+        for entry in index['projects']:
+            project = Project(entry['name'])
+            priority_counts = {PRIORITY_LABELS[label]: count
+                               for label, count in entry['priorities'].items()}
+            project.defer_todos(Shard(self.directory, entry['shard']), entry['count'],
+                                entry['completed'], priority_counts)
+            projects.append(project)
+        return projects, index['seq']
+
+    def load(self):
+        projects, seq = self.read_index()
+        self.journal.close()
+        self.journal.replay(projects, None, seq)
+        self.journal.seq = max(self.journal.seq, seq)
+        return projects
+
+    def save(self, projects):
+        """Write the index and any shards that changed, then empty the journal"""
+        names = set()
+        entries = []
+        for project in projects:
+            if isinstance(project.loader, Shard):
+                name = project.loader.name  # Never loaded, so unchanged
+            else:
+                data = json.dumps([todo.to_dict() for todo in project.todos]).encode('utf-8')
+                name = hashlib.sha1(data).hexdigest()[:20] + '.json'
+                if name not in names:
+                    self.write_file(name, data)
+            names.add(name)
+            entries.append({'name': project.name, 'shard': name, 'count': project.todo_count,
+                            'completed': project.completed_count,
+                            'priorities': {priority.label: count for priority, count
+                                           in project.priority_counts.items() if count}})
+        index = json.dumps({'seq': self.journal.seq, 'projects': entries}).encode('utf-8')
+        self.write_file('index.json', index, replace=True)
+        self.journal.truncate()
+        for name in os.listdir(self.directory):
+            if name.endswith('.json') and name != 'index.json' and name not in names:
+                os.remove(os.path.join(self.directory, name))
+
+    def write_file(self, name, data, replace=False):
+        path = os.path.join(self.directory, name)
+        if os.path.exists(path) and not replace:
+            return  # Shards are named by content
+        temp_file = path + '.tmp'
+        with open(temp_file, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_file, path)
+
+    def append(self, changes):
+        self.journal.append(changes)
+        if self.journal.record_count >= self.journal.max_records:
+            self.compact()
+
+    def compact(self):
+        """Fold the journal into the shards it touches"""
+        if self.backup:
+            self.backup()
+        self.save(self.load())
+
+    def backup_data(self) -> Optional[bytes]:
+        """The indexed projects in projects.json form, built from the raw shards"""
+        try:
+            with open(self.index_file, 'rb') as f:
+                index = json.loads(f.read())
+        except FileNotFoundError:
+            return None
+        parts = [b'{"name": %s, "todos": %s}' % (json.dumps(entry['name']).encode('utf-8'),
+                                                 Shard(self.directory, entry['shard']).read())
+                 for entry in index['projects']]
+        return b'[' + b', '.join(parts) + b']'
+
+    def close(self):
+        self.journal.close()
+
+def migrate_json(target, data_file: str = 'projects.json'):
+    """Copy a projects.json workspace (including its journal) into another storage"""
+    source = JsonStorage(data_file)
+    projects = source.load()
+    source.close()
+    target.save(projects)
+    target.close()
+    return projects
+
+def migrate_json_to_sqlite(data_file: str = 'projects.json', db_path: str = 'todo.db'):
+    """Copy a projects.json workspace (including its journal) into a SQLite database"""
+    return migrate_json(SqliteStorage(db_path), data_file)
+
+
+def frozen_change(change):
+    """Copy of a change record with its todos as dicts, safe from later edits"""
+    if 'todo' in change:
+        return dict(change, todo=Todo.coerce(change['todo']).to_dict())
+    if 'todos' in change:
+        return dict(change, todos=[Todo.coerce(todo).to_dict() for todo in change['todos']])
+    return change
+
+def copy_projects(projects):
+    copies = []
+    for project in projects:
+        copy = Project(project.name)
+        if project.loader is not None:
+            copy.defer_todos(project.loader, project.deferred_count, project.completed_count,
+                             dict(project.priority_counts))
+        else:
+            copy.todos = [todo.copy() for todo in project.todos]
+        copies.append(copy)
+    return copies
+
+class BackgroundWriter(Storage):
+    """Wraps a storage backend so that writes happen on a background thread.
+
+    append(), save() and defer() only queue work and return.  The writer
+    thread starts once nothing new has been queued for delay seconds, so a
+    burst of edits is written as one append.  Queued data is copied, so the
+    caller may keep editing.  flush() and close() wait for the queue to
+    drain; an error from the writer thread is raised by the next call.
+
+    lock() hands the inner storage's lock over to the writer thread, which
+    lets go of it once what was queued under it is written: other sessions
+    wait for the change to reach disk, this one does not.
+    """
+    def __init__(self, storage, delay: float = 0.5):
+        self.storage = storage
+        self.delay = delay
+        self.jobs = []  # ('append', changes), ('save', projects) or ('call', fn)
+        self.unlocks = []  # Exits of inner locks to run once the jobs before them are written
+        self.held = 0  # Inner locks handed over and not yet let go of
+        self.io = threading.Lock()  # Keeps the writer thread and poll() out of each other's way
+        self.last_queued = 0.0
+        self.writing = False
+        self.flushing = 0
+        self.closed = False
+        self.error = None
+        self.condition = threading.Condition()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    @property
+    def backup(self):
+        return self.storage.backup
+
+    @backup.setter
+    def backup(self, backup):
+        self.storage.backup = backup
+
+    @property
+    def progress(self):
+        return self.storage.progress
+
+    @progress.setter
+    def progress(self, progress):
+        self.storage.progress = progress
+
+    def queue(self, kind, item):
+        with self.condition:
+            self.raise_error()
+            jobs = self.jobs
+            if kind == 'append' and jobs and jobs[-1][0] == 'append':
+                jobs[-1][1].extend(item)
+            else:
+                if kind == 'save':
+                    # Writes since the last deferred call are part of the new snapshot
+                    while jobs and jobs[-1][0] != 'call':
+                        jobs.pop()
+                jobs.append((kind, item))
+            self.last_queued = time.monotonic()
+            self.condition.notify_all()
+
+    def append(self, changes):
+        self.queue('append', [frozen_change(change) for change in changes])
+
+    def save(self, projects):
+        self.queue('save', copy_projects(projects))
+
+    def defer(self, fn):
+        self.queue('call', fn)
+
+    @contextmanager
+    def lock(self):
+        """Hold the inner storage's lock until what was queued under it is written"""
+        inner = self.storage.lock()
+        inner.__enter__()
+        try:
+            yield
+        finally:
+            with self.condition:
+                self.unlocks.append(inner)
+                self.held += 1
+                self.condition.notify_all()
+
+    def poll(self):
+        with self.condition:
+            self.raise_error()
+            if self.held:
+                return []  # Nobody else can have written since this session last looked
+        with self.io:
+            return self.storage.poll()
+
+    def load(self):
+        self.flush()
+        return self.storage.load()
+
+    def backup_data(self) -> Optional[bytes]:
+        return self.storage.backup_data()
+
+    def raise_error(self):
+        if self.error:
+            error, self.error = self.error, None
+            raise error
+
+    def run(self):
+        while True:
+            with self.condition:
+                while not self.jobs and not self.unlocks and not self.closed:
+                    self.condition.wait()
+                if not self.jobs and not self.unlocks:
+                    return
+                # Wait for a pause in the edits unless someone needs them written now
+                while not self.flushing and not self.closed:
+                    remaining = self.last_queued + self.delay - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self.condition.wait(remaining)
+                jobs, self.jobs = self.jobs, []
+                unlocks, self.unlocks = self.unlocks, []
+                self.writing = True
+            try:
+                with self.io:
+                    for kind, item in jobs:
+                        if kind == 'append':
+                            self.storage.append(item)
+                        elif kind == 'save':
+                            self.storage.save(item)
+                        else:
+                            item()
+            except Exception as e:
+                self.error = e
+            finally:
+                with self.condition:  # So poll() never sees a lock let go of but still counted
+                    for inner in unlocks:
+                        inner.__exit__(None, None, None)
+                    self.held -= len(unlocks)
+                    self.writing = False
+                    self.condition.notify_all()
+
+    def flush(self):
+        with self.condition:
+            self.flushing += 1
+            self.condition.notify_all()
+            while self.jobs or self.unlocks or self.writing:
+                self.condition.wait()
+            self.flushing -= 1
+            self.raise_error()
+
+    def close(self):
+        if self.closed:
+            return
+        self.flush()
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+        self.thread.join()
+        self.storage.close()
+
+
+class TodoClient:
+    """Blocking connection to a TodoServer.
+
+    Requests and replies are JSON lines; request() waits for the reply to
+    its own request.  Change events the server pushes in the meantime are
+    kept in pending_events until events() hands them out.
+    """
+    def __init__(self, path: str = 'todo.sock'):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(path)
+        self.buffer = b''
+        self.next_id = 0
+        self.pending_events = []
+
+    def send(self, message):
+        self.sock.sendall(json.dumps(message, default=Todo.to_dict).encode('utf-8') + b'\n')
+
+    def receive(self, block: bool = True):
+        """Messages that arrived whole, waiting for at least one if block is set"""
+        chunks = [self.buffer]
+        self.sock.setblocking(block)
+        try:
+            while True:
+                try:
+                    chunk = self.sock.recv(1 << 16)
+                except BlockingIOError:
+                    break
+                if not chunk:
+                    raise ConnectionError("The todo server closed the connection")
+                chunks.append(chunk)
+                if b'\n' in chunk:
+                    if block:
+                        break
+        finally:
+            self.sock.setblocking(True)
+        *lines, self.buffer = b''.join(chunks).split(b'\n')
+        return [json.loads(line) for line in lines]
+
+    def request(self, op: str, **fields):
+        """Send a request and return the result the server replied with"""
+        self.next_id += 1
+        self.send(dict(fields, op=op, id=self.next_id))
+        while True:
+            for message in self.receive():
+                if 'id' not in message:
+                    self.pending_events.append(message)
+                elif 'error' in message:
+                    raise RuntimeError(message['error'])
+                else:
+                    return message['result']
+
+    def call(self, method: str, *args, project=None, todo=None, **kwargs):
+        """Call a TodoManager method in the server, with project (index or name)
+        and todo (index) selected first"""
+        return self.request('call', method=method, args=args, kwargs=kwargs,
+                            project=project, todo=todo)
+
+    def events(self):
+        """Change events pushed since the last call, without waiting"""
+        events = self.pending_events + self.receive(block=False)
+        self.pending_events = []
+        return events
+
+    def close(self):
+        self.sock.close()
+
+class RemoteStorage(Storage):
+    """Storage backend that edits the workspace held by a TodoServer.
+
+    The server's storage stays the only one touching the files.  Other
+    sessions' changes arrive as pushed events, numbered so that those
+    already contained in a load() can be skipped.
+    """
+    def __init__(self, path: str = 'todo.sock'):
+        self.client = TodoClient(path)
+        self.seq = 0
+        self.lock_depth = 0
+
+    def load(self):
+        reply = self.client.request('load')
+        self.seq = reply['seq']
+        return parse_projects(reply['projects'])
+
+    def save(self, projects):
+        self.seq = self.client.request(
+            'save', projects=[{'name': p.name, 'todos': p.todos} for p in projects])
+
+    def append(self, changes):
+        self.seq = self.client.request('append', changes=changes)
+
+    @contextmanager
+    def lock(self):
+        if not self.lock_depth:
+            self.client.request('lock')
+        self.lock_depth += 1
+        try:
+            yield
+        finally:
+            self.lock_depth -= 1
+            if not self.lock_depth:
+                self.client.request('unlock')
+
+    def poll(self):
+        changes = []
+        for event in self.client.events():
+            if event['seq'] <= self.seq:
+                continue
+            self.seq = event['seq']
+            if event['changes'] is None:
+                changes = None  # Reloading also picks up what came before
+            elif changes is not None:
+                changes.extend(event['changes'])
+        return changes
+
+    def backup_data(self) -> Optional[bytes]:
+        data = self.client.request('backup_data')
+        return None if data is None else data.encode('utf-8')
+
+    def close(self):
+        self.client.close()
+
+
+def trigrams(text: str):
+    """Trigrams of a lowercased field, padded so every 1-2 character substring starts one"""
+    text += '\0\0'
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+class SearchIndex:
+    """Inverted index answering search_todos() queries.
+
+    Descriptions and categories are indexed by trigram, with a map from one
+    and two character prefixes to the trigrams that start with them, so any
+    substring query resolves to posting sets instead of a scan.  Priority,
+    completion state, category and due date have their own posting sets.
+    The index is built on the first search and kept up to date from the
+    change records after that.
+    """
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self.built = False
+        self.entries = {}     # doc id -> (project, todo, description, categories, due)
+        self.doc_ids = {}     # id(todo) -> doc id
+        self.grams = {}       # trigram -> doc ids
+        self.prefixes = {}    # 1-2 character prefix -> trigrams
+        self.priorities = {}  # priority -> doc ids
+        self.completed = set()
+        self.pending = set()
+        self.categories = {}  # lowercased category -> doc ids
+        self.due = {}         # due date ordinal -> doc ids
+        self.due_dates = []   # ordinals in due, sorted
+        self.positions = {}   # id(project) -> {doc id: position in project.todos}
+        self.next_id = 0
+
+    def rebuild(self, projects):
+        self.clear()
+        for project in projects:
+            for todo in project.todos:
+                self.add(project, todo)
+        self.built = True
+
+    def doc_grams(self, doc_id):
+        description, categories = self.entries[doc_id][2:4]
+        grams = trigrams(description)
+        for category in categories:
+            grams |= trigrams(category)
+        return grams
+
+    def add(self, project, todo):
+        doc_id = self.next_id
+        self.next_id += 1
+        self.doc_ids[id(todo)] = doc_id
+        self.entries[doc_id] = (project, todo, todo.description.lower(),
+                                [cat.lower() for cat in todo.categories], todo.due)
+        for gram in self.doc_grams(doc_id):
+            postings = self.grams.get(gram)
+            if postings is None:
+                postings = self.grams[gram] = set()
+                self.prefixes.setdefault(gram[:1], set()).add(gram)
+                self.prefixes.setdefault(gram[:2], set()).add(gram)
+            postings.add(doc_id)
+        self.priorities.setdefault(todo.priority.label, set()).add(doc_id)
+        (self.completed if todo.completed else self.pending).add(doc_id)
+        for category in self.entries[doc_id][3]:
+            self.categories.setdefault(category, set()).add(doc_id)
+        if todo.due:
+            if todo.due not in self.due:
+                self.due[todo.due] = set()
+                insort(self.due_dates, todo.due)
+            self.due[todo.due].add(doc_id)
+        self.positions.pop(id(project), None)
+
+    def remove(self, todo):
+        doc_id = self.doc_ids.pop(id(todo))
+        project = self.entries[doc_id][0]
+        for gram in self.doc_grams(doc_id):
+            postings = self.grams[gram]
+            postings.discard(doc_id)
+            if not postings:
+                del self.grams[gram]
+                for prefix in (gram[:1], gram[:2]):
+                    self.prefixes[prefix].discard(gram)
+                    if not self.prefixes[prefix]:
+                        del self.prefixes[prefix]
+        for docs in self.priorities.values():
+            docs.discard(doc_id)
+        self.completed.discard(doc_id)
+        self.pending.discard(doc_id)
+        _, _, _, categories, due = self.entries[doc_id]
+        for category in categories:
+            self.categories[category].discard(doc_id)
+            if not self.categories[category]:
+                del self.categories[category]
+        if due:
+            self.due[due].discard(doc_id)
+            if not self.due[due]:
+                del self.due[due]
+                del self.due_dates[bisect_left(self.due_dates, due)]
+        del self.entries[doc_id]
+        self.positions.pop(id(project), None)
+
+    def apply(self, projects, change, inverse):
+        """Bring the index up to date with a change applied to projects"""
+        if not self.built:
+            return
+        op = change['op']
+        if op == 'insert_project':
+            project = projects[change['project']]
+            for todo in project.todos:
+                self.add(project, todo)
+        elif op == 'remove_project':
+            for todo in inverse['todos']:
+                self.remove(todo)
+        elif op == 'replace_projects':
+            self.rebuild(projects)
+        elif op == 'insert_todo':
+            project = projects[change['project']]
+            self.add(project, project.todos[change['index']])
+        elif op == 'remove_todo':
+            self.remove(inverse['todo'])
+        elif op == 'update_todo':
+            project = projects[change['project']]
+            todo = project.todos[change['index']]
+            self.remove(todo)
+            self.add(project, todo)
+        elif op == 'move':
+            self.moved(projects[change['project']], change['from'], change['to'])
+        elif op == 'reorder':
+            self.reordered(projects[change['project']])
+
+    def reordered(self, project):
+        self.positions.pop(id(project), None)
+
+    def moved(self, project, src, dst):
+        """Shift cached positions for the todos between a move's endpoints"""
+        positions = self.positions.get(id(project))
+        if positions is not None:
+            for i in range(min(src, dst), max(src, dst) + 1):
+                positions[self.doc_ids[id(project.todos[i])]] = i
+
+    def matching(self, query: str):
+        """Doc ids of todos whose description or a category contains query"""
+        if not query:
+            return set(self.entries)
+        if len(query) < 3:
+            docs = set()
+            for gram in self.prefixes.get(query, ()):
+                docs |= self.grams[gram]
+            return docs
+
+        postings = []
+        for i in range(len(query) - 2):
+            docs = self.grams.get(query[i:i + 3])
+            if docs is None:
+                return set()
+            postings.append(docs)
+        postings.sort(key=len)
+        docs = postings[0].intersection(*postings[1:])
+        if len(query) == 3:
+            return docs
+        # Trigrams only prove the pieces occur, so check the candidates
+        return {doc_id for doc_id in docs
+                if query in self.entries[doc_id][2]
+                or any(query in cat for cat in self.entries[doc_id][3])}
+
+    def position(self, project, doc_id):
+        positions = self.positions.get(id(project))
+        if positions is None:
+            positions = self.positions[id(project)] = {
+                self.doc_ids[id(todo)]: i for i, todo in enumerate(project.todos)}
+        return positions[doc_id]
+
+    def candidates(self, query: str):
+        """Doc ids of todos matching a lowercased query"""
+        docs = self.matching(query)
+        for priority, priority_docs in self.priorities.items():
+            if query in priority:
+                docs |= priority_docs
+        if query == 'completed':
+            docs |= self.completed
+        elif query == 'pending':
+            docs |= self.pending
+        return docs
+
+    def contains(self, doc_id, text: str) -> bool:
+        """Whether lowercased text is in a todo's description or one of its categories"""
+        description, categories = self.entries[doc_id][2:4]
+        return text in description or any(text in cat for cat in categories)
+
+    def matches(self, todo, query: str) -> bool:
+        """Whether an indexed todo matches a lowercased query, leaving out the
+        'completed' and 'pending' keywords"""
+        return self.contains(self.doc_ids[id(todo)], query) or query in todo.priority.label
+
+    def estimate(self, query: str) -> int:
+        """Upper bound on how many todos matching() finds, read off the
+        trigram postings without intersecting them"""
+        if len(query) < 3:
+            return len(self.entries)
+        return min(len(self.grams.get(query[i:i + 3], ())) for i in range(len(query) - 2))
+
+    def due_between(self, start=None, end=None):
+        """The due dates with todos from start through end (ordinals, inclusive)"""
+        lo = 0 if start is None else bisect_left(self.due_dates, start)
+        hi = len(self.due_dates) if end is None else bisect_right(self.due_dates, end)
+        return self.due_dates[lo:hi]
+
+    def ordered(self, projects, docs):
+        """(project, todo) pairs for docs, in display order"""
+        project_order = {id(project): i for i, project in enumerate(projects)}
+        keyed = []
+        for doc_id in docs:
+            project, todo = self.entries[doc_id][:2]
+            keyed.append((project_order[id(project)], self.position(project, doc_id), project, todo))
+        keyed.sort(key=lambda k: k[:2])
+        return [(project, todo) for _, _, project, todo in keyed]
+
+    def walk(self, projects, docs):
+        """Yield (project, todo) pairs for docs in display order, by going through
+        the projects; cheaper than ordered() for reading the first few of many"""
+        doc_ids = self.doc_ids
+        for project in projects:
+            for todo in project.todos:
+                if doc_ids[id(todo)] in docs:
+                    yield project, todo
+
+    def search(self, projects, query: str):
+        """Return (project name, todo) pairs matching a lowercased query, in display order"""
+        return [(project.name, todo) for project, todo in self.ordered(projects, self.candidates(query))]
+
+    def results(self, projects, query: str, previous=None):
+        """SearchResults for a lowercased query.
+
+        When query extends the query of previous and those results were all
+        read, they are filtered instead of asking the index again; the
+        keywords 'completed' and 'pending' match more than their prefixes
+        do, so they always go to the index.
+        """
+        if (previous is not None and previous.complete and query.startswith(previous.query)
+                and query not in ('completed', 'pending')):
+            return SearchResults(query, [row for row in previous.rows if self.matches(row[1], query)])
+        return self.in_order(query, projects, self.candidates(query))
+
+    def in_order(self, query: str, projects, docs):
+        """SearchResults listing docs in display order"""
+        if len(docs) <= SearchResults.SORT_LIMIT:
+            return SearchResults(query, self.ordered(projects, docs))
+        return SearchResults(query, [], self.walk(projects, docs), len(docs))
+
+
+class SearchResults:
+    """Matches of a query in display order, produced only as far as they are read.
+
+    Up to SORT_LIMIT matches are put in order at once.  More than that are
+    found by walking the projects in order, which with so many matches
+    reaches the end of a screenful quickly, instead of ordering them all
+    before the first one can be shown.
+    """
+    SORT_LIMIT = 1000
+
+    def __init__(self, query: str, rows, walk=None, count: Optional[int] = None):
+        self.query = query
+        self.rows = rows  # (project, todo) pairs produced so far
+        self.walk = walk  # Produces the rest, or None once all are in rows
+        self.count = len(rows) if count is None else count
+
+    @property
+    def complete(self) -> bool:
+        return self.walk is None
+
+    def page(self, start: int, count: int):
+        """The (project, todo) pairs from start to start + count"""
+        needed = start + count - len(self.rows)
+        if needed > 0 and self.walk is not None:
+            self.rows.extend(islice(self.walk, needed))
+            if len(self.rows) >= self.count:
+                self.walk = None
+        return self.rows[start:start + count]
+
+
+QUERY_TOKEN = re.compile(r'(-?)(?:"([^"]*)"|(\w+(?:<=|>=|<|>|:|=)"[^"]*"|\S+))')
+QUERY_FIELD = re.compile(r'(priority|p|category|cat|project|due)(<=|>=|<|>|:|=)(.+)$', re.IGNORECASE)
+
+class FilterQuery:
+    """A filter query, parsed once and then run against a SearchIndex.
+
+    A todo must satisfy every term, and a leading '-' negates a term:
+
+        done, pending               completion
+        priority:high (p:)          priority
+        cat:infra (category:)       category, ignoring case
+        project:Work                project, by name
+        project:"Home Office"       a quoted value, for names with spaces
+        due<2026-11-01, due>=today  due date (<, <=, >, >=, and : or = for one day)
+        due:none                    no due date
+        word, "some words"          text in the description or a category
+
+    Terms with posting sets in the index (completion, priority, category,
+    project, due date) are selections: the smallest is read and the others
+    narrow it down, cheapest first.  Negated terms and text are only ever
+    checked against what is left, unless the trigram index shows a text
+    term to be rarer than any selection, so a query costs time in
+    proportion to its smallest selection rather than to the workspace.
+    """
+    def __init__(self, text: str):
+        self.text = text
+        self.parsed = date.today()  # What 'today' and the like meant
+        self.terms = []  # (negated, kind, value)
+        for negated, quoted, word in QUERY_TOKEN.findall(text):
+            if quoted:
+                self.terms.append((bool(negated), 'text', quoted.lower()))
+            elif word:
+                self.terms.append((bool(negated),) + self.parse_term(word))
+
+    @staticmethod
+    def parse_term(word):
+        lowered = word.lower()
+        if lowered in ('done', 'completed', 'pending'):
+            return 'completed', lowered != 'pending'
+        field = QUERY_FIELD.match(word)
+        if not field:
+            return 'text', lowered
+        name, op, value = field.groups()
+        name = name.lower()
+        if len(value) > 1 and value[0] == value[-1] == '"':
+            value = value[1:-1]
+        if name in ('priority', 'p'):
+            if value.lower() not in PRIORITY_LABELS:
+                raise ValueError(f"Unknown priority: {value}")
+            return 'priority', value.lower()
+        if name in ('category', 'cat'):
+            return 'category', value.lower()
+        if name == 'project':
+            return 'project', value
+        if value.lower() == 'none' and op in (':', '='):
+            return 'no_due', None
+        due = parse_due_date(value)
+        if due is None:
+            raise ValueError(f"Not a date: {value}")
+        day = date_ordinal(due)
+        return 'due', {'<': (None, day - 1), '<=': (None, day), '>': (day + 1, None),
+                       '>=': (day, None)}.get(op, (day, day))
+
+    def selection(self, index, projects, kind, value):
+        """(size, docs, test) for a term the index can select by, or None.
+
+        docs() returns the selected doc ids.  test is None when docs() is
+        a posting set, cheap to intersect with; otherwise it checks one doc
+        id, for narrowing down a smaller selection without building this one.
+        """
+        if kind == 'completed':
+            docs = index.completed if value else index.pending
+        elif kind == 'priority':
+            docs = index.priorities.get(value, set())
+        elif kind == 'category':
+            docs = index.categories.get(value, set())
+        elif kind == 'project':
+            matching = [p for p in projects if p.name == value]
+            return (sum(len(p.todos) for p in matching),
+                    lambda: {index.doc_ids[id(todo)] for p in matching for todo in p.todos},
+                    lambda doc_id: any(index.entries[doc_id][0] is p for p in matching))
+        elif kind == 'due':
+            start, end = value
+            days = index.due_between(start, end)
+
+            def due_test(doc_id):
+                due = index.entries[doc_id][4]
+                return bool(due) and (start is None or due >= start) and (end is None or due <= end)
+            return (sum(len(index.due[day]) for day in days),
+                    lambda: set().union(*(index.due[day] for day in days)), due_test)
+        else:
+            return None
+        return len(docs), lambda: docs, None
+
+    @staticmethod
+    def test(index, kind, value):
+        """Check of one doc id against a text or due:none term"""
+        entries = index.entries
+        if kind == 'text':  # index.contains(), without the call for each of many docs
+            return lambda doc_id: (value in entries[doc_id][2]
+                                   or any(value in cat for cat in entries[doc_id][3]))
+        return lambda doc_id: not entries[doc_id][4]
+
+    def plan(self, index, projects):
+        """The steps run() takes, as (action, fn) pairs.
+
+        'select' returns the doc ids to start from: the smallest selection,
+        or the trigram index's matches for a text term when its rarest
+        trigram is rarer still.  'intersect' and 'exclude' return posting
+        sets to intersect with or take away, and 'filter' checks one doc id,
+        once the posting sets are done with and text terms last of all.
+        """
+        selections, excluded, checks, text = [], [], [], []
+        for negated, kind, value in self.terms:
+            selection = self.selection(index, projects, kind, value)
+            if selection is not None and not negated:
+                selections.append(selection)
+            elif selection is not None and selection[2] is None:
+                excluded.append(('exclude', selection[1]))
+            else:
+                test = selection[2] if selection else self.test(index, kind, value)
+                if negated:
+                    checks.append(lambda doc_id, test=test: not test(doc_id))
+                elif kind == 'text':
+                    text.append((value, test))
+                else:
+                    checks.append(test)
+        selections.sort(key=lambda selection: selection[0])
+        narrowest = min(text, key=lambda term: index.estimate(term[0]), default=None)
+        if narrowest and (not selections or index.estimate(narrowest[0]) < selections[0][0]):
+            text.remove(narrowest)
+            selections.insert(0, (None, lambda: index.matching(narrowest[0]), None))
+        if selections:
+            steps = [('select', selections[0][1])]
+            steps += [('intersect', docs) for _, docs, test in selections[1:] if test is None]
+            steps += [('filter', test) for _, docs, test in selections[1:] if test is not None]
+        else:
+            steps = [('select', lambda: set(index.entries))]
+        return steps + excluded + [('filter', test) for test in checks + [t for _, t in text]]
+
+    def run(self, index, projects):
+        """SearchResults for the todos matching the query"""
+        docs = set()
+        for action, fn in self.plan(index, projects):
+            if action == 'select':
+                docs = fn()  # Maybe a posting set, so never changed in place
+            elif action == 'intersect':
+                docs = docs & fn()
+            elif action == 'exclude':
+                docs = docs - fn()  # Walks docs when it is the smaller, unlike -=
+            else:
+                docs = {doc_id for doc_id in docs if fn(doc_id)}
+            if not docs:
+                break
+        return index.in_order(self.text, projects, docs)
+
+
+class DeadlineIndex:
+    """Pending todos with a due date across every project, bucketed by date.
+
+    Each due date ordinal maps to the todos due that day, and the dates
+    that have any are kept sorted, so the todos due in a range come out in
+    date order at a cost proportional to how many there are, and the next
+    deadline is one bisection away.  Like SearchIndex it is built on first
+    use and kept up to date from the change records after that.  Projects
+    whose todos are still on disk are indexed once something reads them,
+    or when a query asks for every project.
+    """
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self.built = False
+        self.buckets = {}   # due date ordinal -> {id(todo): (project, todo)}
+        self.dates = []     # ordinals that have a bucket, sorted
+        self.due_dates = {}  # id(todo) -> due date ordinal it is indexed under
+        self.deferred = {}  # id(project) -> project whose todos have not been read yet
+        self.loaded = []    # deferred projects read since, to be indexed
+
+    def rebuild(self, projects):
+        self.clear()
+        for project in projects:
+            if project.loader is not None:
+                self.defer(project)
+            else:
+                for todo in project.todos:
+                    self.add(project, todo)
+        self.built = True
+
+    def defer(self, project):
+        self.deferred[id(project)] = project
+        project.on_load = self.loaded.append
+
+    def catch_up(self, load: bool = False):
+        """Index the deferred projects that were read since, or all of them if load"""
+        if load:
+            loaded = list(self.deferred.values())
+        elif self.loaded:
+            loaded = list(self.loaded)
+        else:
+            return  # Nothing was read, so nothing is looked at
+        self.loaded.clear()  # In place, as deferred projects append to this list
+        for project in loaded:
+            if self.deferred.get(id(project)) is not project:
+                continue  # Indexed already, or from an earlier workspace
+            project.on_load = None
+            if project.loader is not None and not load:
+                self.defer(project)  # Left on disk again before anything read it
+                continue
+            del self.deferred[id(project)]
+            for todo in project.todos:
+                self.add(project, todo)
+
+    def add(self, project, todo):
+        if todo.completed or not todo.due:
+            return
+        bucket = self.buckets.get(todo.due)
+        if bucket is None:
+            bucket = self.buckets[todo.due] = {}
+            insort(self.dates, todo.due)
+        bucket[id(todo)] = (project, todo)
+        self.due_dates[id(todo)] = todo.due
+
+    def remove(self, todo):
+        due = self.due_dates.pop(id(todo), None)
+        if due is None:
+            return
+        bucket = self.buckets[due]
+        del bucket[id(todo)]
+        if not bucket:
+            del self.buckets[due]
+            del self.dates[bisect_left(self.dates, due)]
+
+    def apply(self, projects, change, inverse):
+        """Bring the index up to date with a change applied to projects"""
+        if not self.built:
+            return
+        # A change to a deferred project has just read its todos, this one included
+        self.catch_up()
+        op = change['op']
+        if op == 'insert_project':
+            project = projects[change['project']]
+            for todo in project.todos:
+                self.add(project, todo)
+        elif op == 'remove_project':
+            for todo in inverse['todos']:
+                self.remove(todo)
+        elif op == 'replace_projects':
+            self.rebuild(projects)
+        elif op == 'insert_todo':
+            project = projects[change['project']]
+            self.add(project, project.todos[change['index']])
+        elif op == 'remove_todo':
+            self.remove(inverse['todo'])
+        elif op == 'update_todo':
+            project = projects[change['project']]
+            todo = project.todos[change['index']]
+            self.remove(todo)
+            self.add(project, todo)
+
+    def due(self, start=None, end=None):
+        """Yield (project, todo) for todos due from start through end, by date"""
+        lo = 0 if start is None else bisect_left(self.dates, start)
+        hi = len(self.dates) if end is None else bisect_right(self.dates, end)
+        for day in self.dates[lo:hi]:
+            yield from self.buckets[day].values()
+
+    def next_due(self, start):
+        """(project, todo) of a todo with the earliest due date on or after start, or None"""
+        i = bisect_left(self.dates, start)
+        if i == len(self.dates):
+            return None
+        return next(iter(self.buckets[self.dates[i]].values()))
+
+
+class TodoColumns:
+    """Column snapshot of every todo for queries across projects.
+
+    Rows are sorted by (completed, due date), so the pending or completed
+    todos due in a date range are one contiguous slice found by bisection.
+    Due date, priority, completion, project index and the (project,
+    priority) pair are kept as array columns that are filtered and counted
+    with C-level loops (compress, Counter) instead of Python code per todo.
+    The snapshot is never updated in place; TodoManager drops it when the
+    todos change and builds a new one on the next query.
+    """
+    def __init__(self, projects):
+        self.projects = list(projects)
+        todos = [todo for project in projects for todo in project.todos]
+        project_ids = array('l')
+        for p, project in enumerate(projects):
+            project_ids.extend(array('l', [p]) * len(project.todos))
+        due = [todo.due or NO_DUE_DATE for todo in todos]
+        # Completed todos sort after every pending one
+        keys = [d + NO_DUE_DATE * todo.completed for d, todo in zip(due, todos)]
+        order = sorted(range(len(todos)), key=keys.__getitem__)
+
+        self.todos = [todos[i] for i in order]
+        self.due = array('l', [due[i] for i in order])
+        self.project = array('l', [project_ids[i] for i in order])
+        self.completed = array('b', [todo.completed for todo in self.todos])
+        self.priority = array('b', [todo.priority for todo in self.todos])
+        # Both at once, project index * len(Priority) + priority, to count the pairs in one pass
+        self.project_priority = array('l', [p * len(Priority) + priority for p, priority
+                                            in zip(self.project, self.priority)])
+        self.pending_end = bisect_left(self.completed, 1)
+
+    def due_rows(self, start=None, end=None, completed=False) -> range:
+        """Rows of todos due from start through end (date ordinals, inclusive)"""
+        lo, hi = (self.pending_end, len(self.todos)) if completed else (0, self.pending_end)
+        first = lo if start is None else bisect_left(self.due, start, lo, hi)
+        last = bisect_right(self.due, NO_DUE_DATE - 1 if end is None else end, lo, hi)
+        return range(first, max(first, last))
+
+    def values(self, column, rows):
+        values = getattr(self, column)
+        if isinstance(rows, range):
+            return values[rows.start:rows.stop]
+        return map(values.__getitem__, rows)
+
+    def where(self, rows, column, value):
+        """The rows whose column equals value"""
+        return list(compress(rows, map(eq, self.values(column, rows), repeat(value))))
+
+    def count(self, column, rows):
+        """Number of rows per value of a column, e.g. per project index or priority"""
+        return Counter(self.values(column, rows))
 
-    def sort_todos(self):
-        def get_sort_key(todo):
-            completed = todo['completed']
-            if self.sort_by == 'due_date':
-                due_date = todo.get('due_date') or '9999-12-31'
-                return (completed, due_date)
-            elif self.sort_by == 'description':
-                return (completed, todo['description'].lower())
-            elif self.sort_by == 'priority':
-                priority_order = {'high': 0, 'medium': 1, 'low': 2}
-                return (completed, priority_order[todo.get('priority', 'medium')])
-            else:  # created
-                return (completed, todo['created_at'])
-        
-        self.todos.sort(key=get_sort_key, reverse=self.sort_reverse)
-    
+    def select(self, rows):
+        """Return (project name, todo) pairs for rows"""
+        return [(self.projects[self.project[i]].name, self.todos[i]) for i in rows]
 
 
 class TodoManager:
-    def __init__(self):
+    def __init__(self, storage=None, load: bool = True):
+        """With load=False nothing is read until open_workspace() is called"""
         self.projects = []
         self.active_window = 'projects'
         self.project_selection = 0
         self.todo_selection = 0
         self.show_completed = True
         self.backup_dir = 'todo_backups'
-        self.ensure_backup_directory()
-        self.load_data()
+        self.storage = storage or JsonStorage()
+        self.storage.backup = self.write_backup
+        self.pending_changes = []
+        self.backup_lock = threading.Lock()
+        self.backup_store = None
+        # Edits take a restore point first when none was taken for this long (seconds)
+        self.backup_interval = 300
+        self.last_backup = None  # time.monotonic() of the last, None before the first
+        self.search_index = SearchIndex()
+        self.deadline_index = DeadlineIndex()
+        self.columns = None
+        self.filters_file = 'filters.json'
+        self.filters = []  # (name, FilterQuery) of the saved filters, listed after the projects
+        self.view_filter = None  # Index of the saved filter shown instead of a project
+        self.filter_results = None  # ((view_filter, date), SearchResults) until the todos change
+        # Set while inside batch(): (change, inverse) pairs applied in the batch
+        self.batch_changes = None
         self.theme_manager = ThemeManager()
         self.undo_manager = UndoManager()
+        # Called with each list of changes written or taken in from other
+        # sessions, and with None when the whole workspace was replaced
+        self.on_change = None
+        if load:
+            self.open_workspace()
+
+    def open_workspace(self):
+        """Open the backup directory and load the projects from storage"""
+        self.ensure_backup_directory()
+        self.backup_store = BackupStore(self.backup_dir)
+        self.load_data()
+        self.load_filters()
+        startup_profile.mark('load')
+
+    def view_state(self):
+        return (self.project_selection, self.todo_selection, self.show_completed)
+
+    @contextmanager
+    def locked(self):
+        """Keep other sessions from writing, starting from everything they wrote so far"""
+        with self.storage.lock():
+            self.sync()
+            yield
+
+    def sync(self) -> bool:
+        """Apply the changes other sessions have written since the last sync.
+
+        Every session applies earlier records before writing its own, so
+        changes land in the order they were journaled and the later of two
+        edits to the same todo wins.  The selection stays on the same todo,
+        and the undo history is dropped because its steps were recorded
+        against projects that no longer look the same.
+        """
+        changes = self.storage.poll()
+        if changes == []:
+            return False
+        project = self.projects[self.project_selection] if self.projects else None
+        visible = self.get_visible_todos()
+        selected = visible[self.todo_selection] if self.todo_selection < len(visible) else None
+        if changes is None:
+            self.load_data()
+        else:
+            for change in changes:
+                self.apply_change(change)
+        self.undo_manager.clear()
+        if self.on_change:
+            self.on_change(changes)
+
+        self.project_selection = next((i for i, p in enumerate(self.projects) if p is project),
+                                      min(self.project_selection, max(0, len(self.projects) - 1)))
+        if self.view_filter is None:
+            visible = self.get_visible_todos()
+            self.todo_selection = next((i for i, todo in enumerate(visible) if todo is selected),
+                                       min(self.todo_selection, max(0, len(visible) - 1)))
+        return True
 
     def save_state(self):
         """Save current state for undo/redo"""
-        state = {
-            'projects': [{
-                'name': p.name,
-                'todos': copy.deepcopy(p.todos),
-                'sort_by': p.sort_by,
-                'sort_reverse': p.sort_reverse,
-                'categories': list(p.categories)
-            } for p in self.projects],
-            'project_selection': self.project_selection,
-            'todo_selection': self.todo_selection,
-            'show_completed': self.show_completed
-        }
-        self.undo_manager.push_state(state)
+        if self.batch_changes is not None:
+            return  # The batch saves the state once, before its first change
+        self.undo_manager.push_state(self.view_state())
+
+    @contextmanager
+    def batch(self):
+        """Group edits into one undo step and one write to storage.
+
+        Inside the block save_state() does nothing; the state at the start of
+        the block is saved before its first change instead.  Sorting, backups
+        and writes are held back until the block ends.  If
+        the block raises, its changes are undone and nothing is written.
+        Nested batches join the outermost one.  The storage stays locked
+        for the whole block.
+        """
+        if self.batch_changes is not None:
+            yield
+            return
+        with self.locked():
+            history = self.undo_manager.snapshot()
+            view = self.view_state()
+            pending = len(self.pending_changes)
+            self.batch_changes = []
+            self.batch_view = view
+            self.unsorted = {}  # id(project) -> project
+            self.backup_due = False
+            self.checkpoint_due = False
+            try:
+                yield
+            except BaseException:
+                for change, inverse in reversed(self.batch_changes):
+                    self.apply_change(inverse)
+                del self.pending_changes[pending:]
+                self.undo_manager.restore(history)
+                self.project_selection, self.todo_selection, self.show_completed = view
+                raise
+            finally:
+                self.batch_changes = None
+
+            for project_index, project in enumerate(self.projects):
+                if id(project) in self.unsorted:
+                    self.sort_project(project_index, project.displaced)
+            if self.backup_due:
+                self.create_backup()
+            if self.checkpoint_due:
+                self.pending_changes = []
+                self.checkpoint()
+            else:
+                self.commit_changes()
 
-    def restore_state(self, state):
-        """Restore from a saved state"""
-        if not state:
+    def restore_state(self, step):
+        """Apply the changes of an undo/redo step and restore its selection"""
+        if not step:
             return False
-            
-        self.projects = []
-        for p in state['projects']:
-            project = Project(p['name'])
-            project.todos = p['todos']
-            project.sort_by = p['sort_by']
-            project.sort_reverse = p['sort_reverse']
-            project.categories = set(p['categories'])
-            self.projects.append(project)
-            
-        self.project_selection = state['project_selection']
-        self.todo_selection = state['todo_selection']
-        self.show_completed = state['show_completed']
+
+        changes, view = step
+        for change in changes:
+            self.apply_change(change)
+            self.pending_changes.append(change)
+        self.project_selection, self.todo_selection, self.show_completed = view
+        self.commit_changes()
         return True
 
+    @timed_operation
+    @exclusive
+    def undo(self):
+        return self.restore_state(self.undo_manager.undo(self.view_state()))
+
+    @timed_operation
+    @exclusive
+    def redo(self):
+        return self.restore_state(self.undo_manager.redo(self.view_state()))
+
+    @timed_operation
+    @exclusive
     def add_todo(self, description: str, due_date: Optional[str] = None, 
                 priority: str = 'medium', categories: List[str] = None) -> None:
         self.save_state()  # Save state before modification
         categories = categories or []
         
-        todo = {
-            'description': description,
-            'completed': False,
-            'created_at': datetime.now().strftime("%Y-%m-%d %H:%M"),
-            'due_date': due_date,
-            'priority': priority,
-            'categories': categories
-        }
-        self.projects[self.project_selection].todos.append(todo)
-        self.projects[self.project_selection].sort_todos()
-        self.save_data()
+        todo = Todo(description, False, datetime.now().strftime("%Y-%m-%d %H:%M"),
+                    due_date, priority, categories)
+        todos = self.projects[self.project_selection].todos
+        self.apply({'op': 'insert_todo', 'project': self.project_selection,
+                    'index': len(todos), 'todo': todo})
+        self.sort_project(self.project_selection, len(todos) - 1)
+        self.commit_changes()
 
+    @timed_operation
     def search_todos(self, query: str):
         """Search todos across all projects"""
-        results = []
-        query = query.lower()
-        for project in self.projects:
-            for todo in project.todos:
-                # Add completion status check
-                if (query in todo['description'].lower() or
-                    any(query in cat.lower() for cat in todo.get('categories', [])) or
-                    query in todo.get('priority', '').lower() or
-                    (query == 'completed' and todo['completed']) or
-                    (query == 'pending' and not todo['completed'])):
-                    results.append((project.name, todo))
-        return results
+        if not self.search_index.built:
+            self.search_index.rebuild(self.projects)
+        return self.search_index.search(self.projects, query.lower())
+
+    @timed_operation
+    def search_results(self, query: str, previous=None):
+        """SearchResults for query, narrowed down from previous (the results of
+        an earlier query) when query extends it"""
+        if not self.search_index.built:
+            self.search_index.rebuild(self.projects)
+        return self.search_index.results(self.projects, query.lower(), previous)
+
+    def run_filter(self, query):
+        """SearchResults for a FilterQuery"""
+        if not self.search_index.built:
+            self.search_index.rebuild(self.projects)
+        return query.run(self.search_index, self.projects)
+
+    @timed_operation
+    def filter_todos(self, text: str):
+        """Return (project name, todo) pairs matching a filter query, in display order"""
+        results = self.run_filter(FilterQuery(text))
+        return [(project.name, todo) for project, todo in results.page(0, results.count)]
+
+    def filtered(self):
+        """SearchResults of the saved filter in view, run again once the todos change"""
+        today = date.today()
+        if self.filter_results is None or self.filter_results[0] != (self.view_filter, today):
+            name, query = self.filters[self.view_filter]
+            if query.parsed != today:
+                query = FilterQuery(query.text)  # 'today' has moved on
+                self.filters[self.view_filter] = (name, query)
+            self.filter_results = ((self.view_filter, today), self.run_filter(query))
+        return self.filter_results[1]
+
+    def load_filters(self):
+        try:
+            with open(self.filters_file, encoding='utf-8') as f:
+                saved = json.load(f)
+        except FileNotFoundError:
+            return
+        self.filters = [(entry['name'], FilterQuery(entry['query'])) for entry in saved]
+
+    def save_filters(self):
+        temp_file = self.filters_file + '.tmp'
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            json.dump([{'name': name, 'query': query.text} for name, query in self.filters], f)
+        os.replace(temp_file, self.filters_file)
+
+    def add_filter(self, name: str, text: str):
+        """Save a filter query under name; raises ValueError if it does not parse"""
+        self.filters.append((name, FilterQuery(text)))
+        self.save_filters()
+
+    def remove_filter(self, index: int):
+        del self.filters[index]
+        self.save_filters()
+        self.view_filter = None
+        self.filter_results = None
+
+    def pane_row(self):
+        """Row of the project pane selected: a project, or after them a saved filter"""
+        if self.view_filter is None:
+            return self.project_selection
+        return len(self.projects) + self.view_filter
+
+    def select_pane_row(self, row: int):
+        """Select a project or, past the last project, a saved filter"""
+        row = max(0, min(row, len(self.projects) + len(self.filters) - 1))
+        if row < len(self.projects):
+            if self.view_filter is not None:
+                self.todo_selection = 0
+            self.view_filter = None
+            self.project_selection = row
+        else:
+            self.view_filter = row - len(self.projects)
+            self.todo_selection = 0
+
+    def focus_filtered(self):
+        """Point the selection at the filter view's selected todo, in its project,
+        so the usual edits apply to it; returns what restore_view() needs"""
+        view = (self.view_filter, self.project_selection, self.todo_selection, self.show_completed)
+        project, todo = self.filtered().page(self.todo_selection, 1)[0]
+        self.show_completed = True  # Keep the selection an index into project.todos
+        self.select_todo(project, todo)
+        return view
+
+    def restore_view(self, view):
+        """Go back to the filter view focus_filtered() left"""
+        self.view_filter, self.project_selection, self.todo_selection, self.show_completed = view
+        self.project_selection = min(self.project_selection, max(0, len(self.projects) - 1))
+        self.todo_selection = min(self.todo_selection, max(0, self.filtered().count - 1))
+        self.active_window = 'todos'
+
+    def todo_columns(self):
+        """Column snapshot of all todos, rebuilt after they change"""
+        if self.columns is None:
+            self.columns = TodoColumns(self.projects)
+        return self.columns
+
+    def deadlines(self, load: bool = False):
+        """The deadline index, built on first use; with load, covering deferred projects too"""
+        if not self.deadline_index.built:
+            self.deadline_index.rebuild(self.projects)
+        self.deadline_index.catch_up(load)
+        return self.deadline_index
+
+    def due_within(self, days: int = 7):
+        """Pending todos across all projects that are overdue or due in the next days"""
+        end = date.today().toordinal() + days
+        return [(project.name, todo) for project, todo in self.deadlines(load=True).due(end=end)]
+
+    def agenda(self, days: int = 7):
+        """Overdue, today's and the next days' pending todos across all projects,
+        as (heading, [(project, todo), ...]) sections"""
+        index = self.deadlines(load=True)
+        today = date.today().toordinal()
+        return [("Overdue", list(index.due(end=today - 1))),
+                ("Today", list(index.due(today, today))),
+                (f"Next {days} days", list(index.due(today + 1, today + days)))]
+
+    def due_report(self, days: int = 7, project: Optional[str] = None):
+        """Pending todos overdue and due in the next days, counted by priority for
+        each project that has any (or only the project named), as (project name,
+        overdue, due soon) with the counts in Priority order"""
+        columns = self.todo_columns()
+        today = date.today().toordinal()
+        overdue, due_soon = columns.due_rows(end=today - 1), columns.due_rows(today, today + days)
+        if project is not None:
+            index = next((p for p, proj in enumerate(columns.projects) if proj.name == project), -1)
+            overdue = columns.where(overdue, 'project', index)
+            due_soon = columns.where(due_soon, 'project', index)
+        overdue = columns.count('project_priority', overdue)
+        due_soon = columns.count('project_priority', due_soon)
+        report = []
+        for p, project in enumerate(columns.projects):
+            first = p * len(Priority)
+            counts = ([overdue[first + priority] for priority in Priority],
+                      [due_soon[first + priority] for priority in Priority])
+            if any(counts[0]) or any(counts[1]):
+                report.append((project.name,) + counts)
+        return report
+
+    def next_deadline(self, today):
+        """(project, todo) of the pending todo due soonest on or after today, or None"""
+        return self.deadlines().next_due(today.toordinal())
+
+    def select_todo(self, project, todo):
+        """Point the selection at a todo, showing completed todos if it is one"""
+        self.view_filter = None
+        self.project_selection = next(i for i, p in enumerate(self.projects) if p is project)
+        if todo.completed:
+            self.show_completed = True
+        self.todo_selection = next(i for i, t in enumerate(self.get_visible_todos()) if t is todo)
+        self.active_window = 'todos'
 
+    @timed_operation
+    @exclusive
     def cycle_priority(self):
         if not self.projects or not self.projects[self.project_selection].todos:
             return
             
         todo = self.projects[self.project_selection].todos[self.todo_selection]
         priorities = ['low', 'medium', 'high']
-        current_priority = todo.get('priority', 'medium')
+        current_priority = todo.priority.label
         
         # Find current index and get next priority
         current_index = priorities.index(current_priority)
         next_index = (current_index + 1) % len(priorities)
-        todo['priority'] = priorities[next_index]
+        self.update_todo({'priority': priorities[next_index]})
         
-        self.projects[self.project_selection].sort_todos()
-        self.save_data()
+        self.sort_project(self.project_selection, self.todo_selection)
+        self.commit_changes()
         
+    @timed_operation
+    @exclusive
     def toggle_todo(self):
         self.save_state()  # Save state before modification
         if not self.projects or not self.projects[self.project_selection].todos:
             return
         todos = self.projects[self.project_selection].todos
-        todos[self.todo_selection]['completed'] = not todos[self.todo_selection]['completed']
-        self.projects[self.project_selection].sort_todos()  # Sort after toggling
-        self.save_data()
+        self.update_todo({'completed': not todos[self.todo_selection].completed})
+        self.sort_project(self.project_selection, self.todo_selection)  # Sort after toggling
+        self.commit_changes()
 
     def ensure_backup_directory(self):
         """Create backup directory if it doesn't exist"""
         if not os.path.exists(self.backup_dir):
             os.makedirs(self.backup_dir)
 
+    @timed_operation
     def create_backup(self):
-        """Create a backup of the current projects.json file"""
-        if os.path.exists('projects.json'):
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            backup_path = os.path.join(self.backup_dir, f'projects_{timestamp}.json')
-            shutil.copy2('projects.json', backup_path)
-            
-            # Keep only the last 10 backups
-            backups = sorted([f for f in os.listdir(self.backup_dir) if f.startswith('projects_')])
-            while len(backups) > 10:
-                os.remove(os.path.join(self.backup_dir, backups.pop(0)))
+        """Create a backup of the saved projects"""
+        if self.batch_changes is not None:
+            self.backup_due = True  # Storage is untouched until the batch ends
+            return
+        self.last_backup = time.monotonic()
+        self.storage.defer(self.write_backup)
 
+    @timed_operation
+    def write_backup(self):
+        with self.backup_lock:
+            data = self.storage.backup_data()
+            if data is not None:
+                timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+                self.backup_store.add(f'projects_{timestamp}.json', data)
+
+    @timed_operation
     def load_data(self):
-        try:
-            with open('projects.json', 'r') as f:
-                data = json.load(f)
-                self.projects = [Project(p['name']) for p in data]
-                for proj, saved_proj in zip(self.projects, data):
-                    proj.todos = saved_proj['todos']
-        except FileNotFoundError:
-            self.projects = [Project("Default")]
+        """Load the projects from storage"""
+        self.projects = self.storage.load()
+        self.columns = None
+        self.filter_results = None
+        if self.search_index.built:
+            self.search_index.rebuild(self.projects)
+        if self.deadline_index.built:
+            self.deadline_index.rebuild(self.projects)
 
+    @timed_operation
+    @exclusive
     def save_data(self):
         """Save data with automatic backup"""
         self.create_backup()  # Create backup before saving
-        data = [{'name': p.name, 'todos': p.todos} for p in self.projects]
-        with open('projects.json', 'w') as f:
-            json.dump(data, f)
+        self.checkpoint()
+
+    @timed_operation
+    def checkpoint(self):
+        """Write every project to storage"""
+        if self.batch_changes is not None:
+            self.checkpoint_due = True
+            return
+        self.storage.save(self.projects)
+        if self.on_change:
+            self.on_change(None)
+
+    def close(self):
+        self.storage.close()  # Runs any backups still queued, so the store closes after
+        if self.backup_store:
+            self.backup_store.close()
+
+    def apply_change(self, change):
+        """Apply a change to the in-memory projects and keep the search index in step"""
+        inverse = apply_change(self.projects, change)
+        self.search_index.apply(self.projects, change, inverse)
+        self.deadline_index.apply(self.projects, change, inverse)
+        self.filter_results = None
+        if change['op'] not in ('move', 'reorder', 'sort_mode'):
+            self.columns = None  # Column rows do not depend on todo order
+        return inverse
+
+    def apply(self, change):
+        """Apply a change to the in-memory projects and record it"""
+        self.record(change, self.apply_change(change))
+
+    def record(self, change, inverse):
+        """Queue an applied change for storage and the undo history"""
+        self.filter_results = None  # Moves made by sort_project() reorder the todos in place
+        self.pending_changes.append(change)
+        if self.batch_changes is not None:
+            if not self.batch_changes:
+                self.undo_manager.push_state(self.batch_view)
+            self.batch_changes.append((change, inverse))
+        self.undo_manager.record(change, inverse)
+
+    def update_todo(self, fields):
+        """Change fields of the selected todo"""
+        self.apply({'op': 'update_todo', 'project': self.project_selection,
+                    'index': self.todo_selection, 'fields': fields})
+
+    def sort_project(self, project_index, index=None):
+        """Restore a project's sort order after the todo at index changed.
+
+        Only that todo is moved when the rest of the project is known to be in
+        order; otherwise the whole project is sorted.  Either way the resulting
+        move or reorder is queued for storage.
+        """
+        project = self.projects[project_index]
+        if self.batch_changes is not None:
+            self.unsorted[id(project)] = project
+            return
+        if index is not None and project.can_reposition(index):
+            new_index = project.reposition(index)
+            if new_index != index:
+                self.search_index.moved(project, index, new_index)
+                self.record({'op': 'move', 'project': project_index, 'from': index, 'to': new_index},
+                            {'op': 'move', 'project': project_index, 'from': new_index, 'to': index})
+            return
+
+        old_order = list(project.todos)
+        project.sort_todos()
+        window = diff_order(old_order, project.todos)
+        if window:
+            start, order = window
+            self.search_index.reordered(project)
+            self.record({'op': 'reorder', 'project': project_index, 'start': start, 'order': order},
+                        {'op': 'reorder', 'project': project_index, 'start': start,
+                         'order': invert_order(order)})
+
+    @timed_operation
+    def commit_changes(self):
+        """Write queued changes to storage"""
+        if self.batch_changes is not None:
+            return
+        changes = [c for c in self.pending_changes if c['op'] != 'sort_mode']
+        self.pending_changes = []
+        if not changes:
+            return
+        if any(c['op'] == 'replace_projects' for c in changes):
+            self.save_data()  # Whole-workspace changes go straight to the snapshot
+            return
+        if self.last_backup is None or time.monotonic() - self.last_backup >= self.backup_interval:
+            self.create_backup()  # Taken once what is queued is written, so before these changes
+        self.storage.append(changes)
+        if self.on_change:
+            self.on_change(changes)
 
     def get_visible_todos(self):
         if not self.projects:
             return []
-        todos = self.projects[self.project_selection].todos
         if not self.show_completed:
-            todos = [todo for todo in todos if not todo['completed']]
-        return todos
+            return self.projects[self.project_selection].pending_todos()
+        return self.projects[self.project_selection].todos
 
+    @timed_operation
     def toggle_completed_visibility(self):
         self.show_completed = not self.show_completed
+        if self.view_filter is not None:
+            return  # Filters say for themselves whether they want completed todos
         visible_todos = self.get_visible_todos()
         if self.todo_selection >= len(visible_todos):
             self.todo_selection = max(0, len(visible_todos) - 1)
 
+    @timed_operation
+    @exclusive
     def add_project(self, name):
-        self.projects.append(Project(name))
-        self.save_data()
+        self.apply({'op': 'insert_project', 'project': len(self.projects), 'name': name})
+        self.commit_changes()
 
+    @timed_operation
+    @exclusive
     def delete_todo(self):
         self.save_state()  # Save state before modification
         if not self.projects or not self.projects[self.project_selection].todos:
             return
         todos = self.projects[self.project_selection].todos
-        del todos[self.todo_selection]
+        self.apply({'op': 'remove_todo', 'project': self.project_selection,
+                    'index': self.todo_selection})
         if self.todo_selection >= len(todos):
             self.todo_selection = max(0, len(todos) - 1)
-        self.save_data()
+        self.commit_changes()
+
+    @timed_operation
+    @exclusive
+    def import_todos(self, records, default_project: Optional[str] = None) -> int:
+        """Add todos from an iterable of records in one batch, returning how many.
+
+        A record holds the todo fields of projects.json plus an optional
+        'project' name; missing projects are created.  Every record is read
+        and checked before anything changes, so a bad one (ValueError) leaves
+        the workspace as it was.  The import is one undo step; each project
+        is sorted once and the workspace is backed up and written once, at
+        the end, instead of once per todo as with add_todo().
+        """
+        default_project = default_project or self.projects[self.project_selection].name
+        created = minute_ordinal(datetime.now().strftime("%Y-%m-%d %H:%M"))
+        added = {}
+        for number, record in enumerate(records, 1):
+            try:
+                name = record.get('project') or default_project
+                todo = Todo.from_dict(record)
+            except (AttributeError, KeyError, TypeError, ValueError) as e:
+                raise ValueError(f"Record {number} is not a todo: {e!r}") from e
+            if todo.created_at is None:
+                todo.created = created
+            added.setdefault(name, []).append(todo)
+
+        with self.batch():
+            self.create_backup()  # Create backup before importing
+            positions = {project.name: i for i, project in enumerate(self.projects)}
+            for name, todos in added.items():
+                if name in positions:
+                    index = positions[name]
+                    for todo in todos:
+                        self.apply({'op': 'insert_todo', 'project': index,
+                                    'index': len(self.projects[index].todos), 'todo': todo})
+                else:
+                    index = positions[name] = len(self.projects)
+                    self.apply({'op': 'insert_project', 'project': index, 'name': name,
+                                'todos': todos})
+                self.sort_project(index)
+            self.checkpoint()  # One snapshot rather than a journal record per todo
+        return sum(len(todos) for todos in added.values())
+
+    def export_todos(self):
+        """Yield every todo as a record for write_todo_records()"""
+        for project in self.projects:
+            for todo in project.todos:
+                record = {'project': project.name}
+                record.update(todo.to_dict())
+                yield record
 
     def delete_project(self, stdscr=None):
         if not self.projects:
@@ -363,65 +3285,244 @@ class TodoManager:
             while True:
                 confirm = stdscr.getch()
                 if confirm == ord('y'):
-                    self.create_backup()  # Create backup before deletion
-                    del self.projects[self.project_selection]
-                    if self.project_selection >= len(self.projects):
-                        self.project_selection = max(0, len(self.projects) - 1)
-                    self.save_data()
+                    with self.locked():
+                        self.create_backup()  # Create backup before deletion
+                        self.apply({'op': 'remove_project', 'project': self.project_selection})
+                        if self.project_selection >= len(self.projects):
+                            self.project_selection = max(0, len(self.projects) - 1)
+                        self.commit_changes()
                     return True
                 elif confirm == ord('n'):
                     return False
         return False
 
+    @timed_operation
+    @exclusive
     def edit_todo(self, new_description=None, new_due_date=None, new_priority=None):
         self.save_state()  # Save state before modification
         if not self.projects or not self.projects[self.project_selection].todos:
             return
-        todo = self.projects[self.project_selection].todos[self.todo_selection]
+        fields = {}
         if new_description:
-            todo['description'] = new_description
+            fields['description'] = new_description
         if new_due_date is not None:
-            todo['due_date'] = new_due_date if new_due_date else None
+            fields['due_date'] = new_due_date if new_due_date else None
         if new_priority:
-            todo['priority'] = new_priority
-        self.projects[self.project_selection].sort_todos()
-        self.save_data()
+            fields['priority'] = new_priority
+        self.update_todo(fields)
+        self.sort_project(self.project_selection, self.todo_selection)
+        self.commit_changes()
 
+    @timed_operation
+    @exclusive
     def toggle_sort(self, sort_by):
         if not self.projects:
             return
         project = self.projects[self.project_selection]
         if project.sort_by == sort_by:
-            project.sort_reverse = not project.sort_reverse
+            sort_reverse = not project.sort_reverse
         else:
-            project.sort_by = sort_by
-            project.sort_reverse = False
-        project.sort_todos()
+            sort_reverse = False
+        self.apply({'op': 'sort_mode', 'project': self.project_selection,
+                    'sort_by': sort_by, 'sort_reverse': sort_reverse})
+        self.sort_project(self.project_selection)
+        self.commit_changes()
 
+    @timed_operation
+    @exclusive
     def restore_backup(self, backup_file=None):
         """Restore from a backup file"""
         if backup_file is None:
             # Get the most recent backup
-            backups = sorted([f for f in os.listdir(self.backup_dir) if f.startswith('projects_')])
+            backups = self.list_backups()
             if not backups:
                 return False
             backup_file = backups[-1]
         
-        backup_path = os.path.join(self.backup_dir, backup_file)
-        if os.path.exists(backup_path):
-            # Create a backup of current state before restoring
-            self.create_backup()
-            # Restore from backup
-            shutil.copy2(backup_path, 'projects.json')
-            self.load_data()
+        with self.backup_lock:
+            data = self.backup_store.read(backup_file)
+        if data is not None:
+            self.save_state()
+            self.apply({'op': 'replace_projects', 'projects': parse_projects(json.loads(data))})
+            self.commit_changes()
             return True
         return False
 
     def list_backups(self):
         """Return a list of available backups"""
-        if not os.path.exists(self.backup_dir):
-            return []
-        return sorted([f for f in os.listdir(self.backup_dir) if f.startswith('projects_')])
+        self.storage.flush()  # Include backups still queued for writing
+        with self.backup_lock:
+            return sorted(self.backup_store.names())
+
+class TodoServer:
+    """Serves one in-memory workspace to the sessions and scripts on this machine.
+
+    Listens on a Unix socket for JSON-line requests.  UI sessions use a
+    RemoteStorage: they hold their own copy of the projects and take turns
+    through lock/unlock, sending the changes they make to the server, which
+    applies them, writes them to its storage and pushes them as events to
+    every other client.  Scripts call TodoManager methods on the server's
+    copy with TodoClient.call().  Every second the server picks up what
+    sessions not going through it wrote to the files.
+    """
+    METHODS = {'add_todo', 'toggle_todo', 'cycle_priority', 'edit_todo', 'delete_todo',
+               'toggle_sort', 'search_todos', 'add_project', 'undo', 'redo', 'save_data',
+               'import_todos', 'export_todos', 'due_within', 'due_report', 'filter_todos'}
+
+    def __init__(self, storage, path: str = 'todo.sock'):
+        self.path = path
+        self.manager = TodoManager(storage)
+        self.manager.on_change = self.broadcast
+        self.writers = set()
+        self.origin = None  # Client whose changes are being written; it has them already
+        self.seq = 0
+        self.lock = None  # asyncio.Lock, made once the event loop runs
+        self.holder = None
+        self.held = ExitStack()
+
+    def broadcast(self, changes):
+        """Push changes (None: reload everything) to every client but their origin"""
+        self.seq += 1
+        line = json.dumps({'seq': self.seq, 'changes': changes}, default=Todo.to_dict)
+        for writer in self.writers:
+            if writer is not self.origin:
+                writer.write(line.encode('utf-8') + b'\n')
+
+    async def handle(self, reader, writer):
+        self.writers.add(writer)
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                request_id = None
+                try:
+                    request = json.loads(line)
+                    request_id = request['id']
+                    result = await self.dispatch(writer, request)
+                    reply = json.dumps({'id': request_id, 'result': result}, default=Todo.to_dict)
+                except Exception as e:
+                    # Even a line that is not a request gets a reply rather than a dropped connection
+                    reply = json.dumps({'id': request_id, 'error': f"{type(e).__name__}: {e}"})
+                writer.write(reply.encode('utf-8') + b'\n')
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self.writers.discard(writer)
+            if self.holder is writer:
+                self.unlock()
+            writer.close()
+
+    def unlock(self):
+        self.holder = None
+        try:
+            self.held.close()
+        finally:
+            self.lock.release()
+
+    def check_holder(self, writer):
+        if self.holder is not writer:
+            raise RuntimeError("the workspace is not locked by this client")
+
+    async def dispatch(self, writer, request):
+        manager = self.manager
+        op = request['op']
+        if op == 'lock':
+            await self.lock.acquire()
+            self.holder = writer
+            try:
+                self.held.enter_context(manager.locked())
+            except BaseException:
+                self.unlock()
+                raise
+            return self.seq
+        if op == 'unlock':
+            self.check_holder(writer)
+            self.unlock()
+            return self.seq
+        if op == 'load':
+            return {'seq': self.seq,
+                    'projects': [{'name': p.name, 'todos': p.todos} for p in manager.projects]}
+        if op == 'backup_data':
+            data = manager.storage.backup_data()
+            return None if data is None else data.decode('utf-8')
+        if op in ('append', 'save'):
+            self.check_holder(writer)
+            self.origin = writer
+            try:
+                if op == 'append':
+                    for change in request['changes']:
+                        manager.apply_change(change)
+                    manager.pending_changes.extend(request['changes'])
+                    manager.commit_changes()
+                else:
+                    manager.apply_change({'op': 'replace_projects',
+                                          'projects': parse_projects(request['projects'])})
+                    manager.checkpoint()
+            finally:
+                self.origin = None
+            manager.undo_manager.clear()  # Its steps no longer line up with the todos
+            return self.seq
+        if op == 'call':
+            method = request['method']
+            if method not in self.METHODS:
+                raise ValueError(f"Unknown method: {method}")
+            async with self.lock:
+                self.select(request['project'], request['todo'])
+                result = getattr(manager, method)(*request['args'], **request['kwargs'])
+                if method == 'export_todos':
+                    result = list(result)
+            return result
+        raise ValueError(f"Unknown request: {op}")
+
+    def select(self, project, todo):
+        """Point the manager's selection at a project (index or name) and todo index"""
+        manager = self.manager
+        if isinstance(project, str):
+            names = [p.name for p in manager.projects]
+            if project not in names:
+                raise ValueError(f"No project named {project!r}")
+            project = names.index(project)
+        manager.project_selection = project or 0
+        manager.todo_selection = todo or 0
+        manager.show_completed = True
+
+    async def serve(self):
+        import asyncio  # Only the server needs it, and it would slow every start of the UI
+        self.lock = asyncio.Lock()
+        if os.path.exists(self.path):
+            try:
+                TodoClient(self.path).close()
+            except ConnectionRefusedError:
+                os.remove(self.path)  # Left behind by a server that did not shut down
+            else:
+                raise RuntimeError(f"A todo server is already listening on {self.path}")
+        stop = asyncio.Event()
+        for signum in (signal.SIGINT, signal.SIGTERM, signal.SIGHUP):
+            asyncio.get_running_loop().add_signal_handler(signum, stop.set)
+        server = await asyncio.start_unix_server(self.handle, self.path, limit=1 << 30)
+        try:
+            async with server:
+                while not stop.is_set():
+                    try:
+                        await asyncio.wait_for(stop.wait(), 1)
+                    except asyncio.TimeoutError:
+                        if not self.lock.locked():
+                            self.manager.sync()
+                for writer in list(self.writers):
+                    writer.close()
+        finally:
+            os.remove(self.path)
+
+    def run(self):
+        """Serve until SIGINT, SIGTERM or SIGHUP, then write everything and close"""
+        import asyncio
+        try:
+            asyncio.run(self.serve())
+        finally:
+            self.manager.close()
+
 
 def parse_due_date(date_str):
     try:
@@ -438,61 +3539,173 @@ def parse_due_date(date_str):
     except ValueError:
         return None
 
+class RenderCache:
+    """Formatted text and color attribute of each todo.
+
+    Entries are keyed on the fields that affect rendering plus today's date,
+    so an edit to a todo or the date rolling over at midnight makes its entry
+    miss and a steady-state frame does no date parsing at all.
+    """
+    def __init__(self, max_entries: int = 4096):
+        self.max_entries = max_entries
+        self.entries = {}  # id(todo) -> (content key, text, style)
+        self.today = None
+
+    def refresh_date(self):
+        """Pick up the current date, dropping every entry when it has changed"""
+        today = datetime.now().date()
+        if today != self.today:
+            self.today = today
+            self.entries.clear()
+
+    def get(self, todo):
+        if self.today is None:
+            self.refresh_date()
+        key = (todo.description, todo.completed, todo.priority, todo.due)
+        entry = self.entries.get(id(todo))
+        if entry is None or entry[0] != key:
+            if len(self.entries) >= self.max_entries:
+                self.entries.clear()
+            entry = (key, compute_todo_display(todo, self.today),
+                     compute_todo_style(todo, self.today))
+            self.entries[id(todo)] = entry
+        return entry
+
+render_cache = RenderCache()
+
 def get_todo_style(todo):
-    if todo['completed']:
+    return render_cache.get(todo)[2]
+
+def format_todo_display(todo):
+    return render_cache.get(todo)[1]
+
+def compute_todo_style(todo, today):
+    if todo.completed:
         return curses.color_pair(1)
     
-    if todo.get('due_date'):
-        try:
-            due_date = datetime.strptime(todo['due_date'], "%Y-%m-%d").date()
-            today = datetime.now().date()
-            days_until_due = (due_date - today).days
-            
-            if days_until_due < 0:
-                return curses.color_pair(3)  # Red for overdue
-            elif days_until_due <= 2:
-                return curses.color_pair(2)  # Yellow for urgent
-        except ValueError:
-            pass
+    if todo.due:
+        days_until_due = todo.due - today.toordinal()
+        
+        if days_until_due < 0:
+            return curses.color_pair(3)  # Red for overdue
+        elif days_until_due <= 2:
+            return curses.color_pair(2)  # Yellow for urgent
     
     return curses.color_pair(6)  # Default style
 
-def format_todo_display(todo):
+def compute_todo_display(todo, today):
     # Priority indicators
     priority_indicators = {
-        'high': '*** ',
-        'medium': '** ',
-        'low': '* ',
+        Priority.HIGH: '*** ',
+        Priority.MEDIUM: '** ',
+        Priority.LOW: '* ',
     }
     
-    prefix = "✓ " if todo['completed'] else "☐ "
-    priority = todo.get('priority', 'medium')
-    priority_prefix = priority_indicators[priority] if not todo['completed'] else ""
+    prefix = "✓ " if todo.completed else "☐ "
+    priority_prefix = priority_indicators[todo.priority] if not todo.completed else ""
     
     due_date_str = ""
-    if todo.get('due_date'):
-        try:
-            due_date = datetime.strptime(todo['due_date'], "%Y-%m-%d").date()
-            today = datetime.now().date()
-            days_until_due = (due_date - today).days
-            
-            if not todo['completed']:
-                if days_until_due < 0:
-                    due_date_str = f" ⚠ Overdue by {abs(days_until_due)} days"
-                elif days_until_due == 0:
-                    due_date_str = " ⚠ Due today!"
-                elif days_until_due <= 2:
-                    due_date_str = f" ⚠ Due in {days_until_due} days"
-                else:
-                    due_date_str = f" ({todo['due_date']})"
+    if todo.due:
+        days_until_due = todo.due - today.toordinal()
+        
+        if not todo.completed:
+            if days_until_due < 0:
+                due_date_str = f" ⚠ Overdue by {abs(days_until_due)} days"
+            elif days_until_due == 0:
+                due_date_str = " ⚠ Due today!"
+            elif days_until_due <= 2:
+                due_date_str = f" ⚠ Due in {days_until_due} days"
             else:
-                due_date_str = f" (Done: {todo['due_date']})"
-        except ValueError:
-            due_date_str = f" ({todo['due_date']})"
+                due_date_str = f" ({todo.due_date})"
+        else:
+            due_date_str = f" (Done: {todo.due_date})"
+    elif todo.unparsed and todo.due_date:
+        due_date_str = f" ({todo.due_date})"  # Not a date we can read, shown as it was saved
     
-    return f"{prefix}{priority_prefix}{todo['description']}{due_date_str}"
+    return f"{prefix}{priority_prefix}{todo.description}{due_date_str}"
+
+class Viewport:
+    """Scrollable window onto a list that keeps the selected row in view"""
+    def __init__(self, height: int):
+        self.height = max(1, height)
+        self.offset = 0
 
-def draw_status_bar(stdscr, todo_manager):
+    def follow(self, selection: int, total: int) -> range:
+        """Scroll just enough to show selection, returning the indexes in view"""
+        if selection < self.offset:
+            self.offset = selection
+        elif selection >= self.offset + self.height:
+            self.offset = selection - self.height + 1
+        self.offset = max(0, min(self.offset, total - self.height))
+        return range(self.offset, min(total, self.offset + self.height))
+
+    def draw_markers(self, win, total: int, renderer):
+        """Mark the right border when rows are hidden above or below the view"""
+        _, width = win.getmaxyx()
+        renderer.mark(win, 1, width - 1, "▲" if self.offset > 0 else None)
+        renderer.mark(win, self.height, width - 1,
+                      "▼" if self.offset + self.height < total else None)
+
+class Renderer:
+    """Damage tracking for the main screen.
+
+    Remembers what was last drawn at each position and skips anything that
+    has not changed, so moving the selection rewrites only the two affected
+    rows.  Windows are staged with noutrefresh() and sent to the terminal
+    with one doupdate() per frame.
+    """
+    def __init__(self):
+        self.drawn = {}
+        self.full_repaint = True
+
+    def invalidate(self):
+        """Repaint everything next frame, e.g. after a prompt or popup covered the screen"""
+        self.full_repaint = True
+
+    def begin_frame(self) -> bool:
+        """Start a frame, returning True if the caller must redraw the static chrome"""
+        full_repaint = self.full_repaint
+        if full_repaint:
+            self.drawn.clear()
+            self.full_repaint = False
+        return full_repaint
+
+    def changed(self, key, value) -> bool:
+        if self.drawn.get(key) == value:
+            return False
+        self.drawn[key] = value
+        return True
+
+    def put(self, win, y, x, text, attr=curses.A_NORMAL, width=None):
+        """Draw text padded to width, unless the same thing is already there"""
+        if width is not None:
+            text = text[:width].ljust(width)
+        if self.changed((win, y, x), (text, attr)):
+            try:
+                win.addstr(y, x, text, attr)
+            except curses.error:
+                pass  # Writing the bottom-right cell raises after drawing
+
+    def title(self, win, text, width):
+        """Draw a title over a window's top border"""
+        if self.changed((win, 0, 'title'), text):
+            win.hline(0, 1, curses.ACS_HLINE, width)
+            win.addstr(0, 2, text[:width - 2])
+
+    def mark(self, win, y, x, text):
+        """Draw a marker over a window's side border, or restore the border"""
+        if self.changed((win, y, x), text):
+            if text:
+                win.addstr(y, x, text)
+            else:
+                win.addch(y, x, curses.ACS_VLINE)
+
+    def flush(self, *windows):
+        for win in windows:
+            win.noutrefresh()
+        curses.doupdate()
+
+def draw_status_bar(stdscr, todo_manager, renderer=None):
     """Draw status bar at bottom of screen with current context"""
     height, width = stdscr.getmaxyx()
     
@@ -502,20 +3715,36 @@ def draw_status_bar(stdscr, todo_manager):
     
     # Get todo stats
     if todo_manager.projects:
-        todos = todo_manager.projects[todo_manager.project_selection].todos
-        total = len(todos)
-        completed = len([t for t in todos if t['completed']])
-        uncompleted = total - completed
+        project = todo_manager.projects[todo_manager.project_selection]
+        total = len(project.todos)
+        completed = project.completed_count
+        uncompleted = project.pending_count
         progress = f"{completed}/{total} (Done: {completed}, Todo: {uncompleted})"
+        overdue, due_soon = project.due_counts(render_cache.today or datetime.now().date())
+        if overdue:
+            progress += f", Overdue: {overdue}"
+        if due_soon:
+            progress += f", Due soon: {due_soon}"
     else:
         progress = "0/0 (Done: 0, Todo: 0)"
 
+    next_due = ""
+    upcoming = todo_manager.next_deadline(render_cache.today or datetime.now().date())
+    if upcoming:
+        project, task = upcoming
+        next_due = f"Next due: {task.due_date} {task.description} | "
+
     # Build status message
     status = (f" Mode: {todo_manager.active_window.title()} | "
              f"Project: {active_project} | "
              f"Tasks: {progress} | "
+             f"{next_due}"
              f"Theme: {todo_manager.theme_manager.current_theme} ")
     
+    if renderer:
+        renderer.put(stdscr, height-1, 0, status, curses.A_REVERSE, width - 1)
+        return
+
     # Pad with spaces to fill the width
     status = status + " " * (width - len(status) - 1)
     
@@ -532,7 +3761,7 @@ def show_help_window(stdscr, todo_manager):
     max_y, max_x = stdscr.getmaxyx()
     
     # Calculate window dimensions with bounds checking
-    height = min(30, max_y - 4)
+    height = min(32, max_y - 4)
     width = min(70, max_x - 4)
     start_y = (max_y - height) // 2
     start_x = (max_x - width) // 2
@@ -582,12 +3811,16 @@ def show_help_window(stdscr, todo_manager):
         " s        - Sort todos",
         " h        - Hide/show completed",
         " /        - Search todos",
+        " g        - Agenda of todos due soon",
+        " f        - Save a filter, e.g. p:high due<today -done",
+        " d/ENTER  - On a filter: delete it / go to the todo",
         "",
         "Other",
         " t        - Change theme",
         " u        - Undo",
         " Ctrl+r   - Redo",
         " r        - Restore backup",
+        " L        - Show latency stats",
         " ?        - Show this help",
         " q        - Quit"
     ]
@@ -634,11 +3867,261 @@ def show_help_window(stdscr, todo_manager):
     except curses.error:
         pass
 
-def main(stdscr):
+def show_latency_window(stdscr):
+    """Display the rolling latency percentiles of each operation and render phase"""
+    max_y, max_x = stdscr.getmaxyx()
+    rows = latency_stats.summary()
+    height = min(len(rows) + 6, max_y - 4)
+    width = min(76, max_x - 4)
+    start_y = (max_y - height) // 2
+    start_x = (max_x - width) // 2
+
+    shadow_win = curses.newwin(height, width, start_y + 1, start_x + 1)
+    shadow_win.bkgd(' ', curses.A_DIM)
+    shadow_win.refresh()
+
+    stats_win = curses.newwin(height, width, start_y, start_x)
+    stats_win.bkgd(' ', curses.color_pair(6))
+    stats_win.box()
+
+    lines = [f"{'operation':28} {'count':>7} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8}"]
+    for name, count, *times in rows:
+        lines.append(f"{name[:28]:28} {count:7d} " + " ".join(f"{t * 1000:8.2f}" for t in times))
+
+    try:
+        title = "Latency (ms, recent samples)"
+        stats_win.addstr(0, max(2, (width - len(title)) // 2), title, curses.A_BOLD | curses.color_pair(4))
+        for i, line in enumerate(lines):
+            if i >= height - 4:
+                break
+            stats_win.addstr(i + 1, 2, line[:width - 4], curses.color_pair(4) if i == 0 else 0)
+        if height > 4:
+            footer = "Press any key to close"
+            stats_win.addstr(height - 2, max(2, (width - len(footer)) // 2), footer[:width - 4],
+                             curses.color_pair(8))
+        stats_win.refresh()
+        stats_win.getch()
+    except curses.error:
+        pass
+
+def read_keys(win):
+    """Wait for a key, then also take every key already typed after it"""
+    keys = [win.get_wch()]
+    win.nodelay(True)
+    try:
+        while True:
+            keys.append(win.get_wch())
+    except curses.error:
+        pass
+    finally:
+        win.nodelay(False)
+    return keys
+
+def show_search_window(stdscr, todo_manager):
+    """Search as you type, showing the matches a page at a time.
+
+    Keys typed while a search runs are taken together, so the next search
+    covers all of them.  ↑/↓ and PgUp/PgDn move through the matches,
+    Enter goes to the selected todo and Esc closes the window.
+    """
+    max_y, max_x = stdscr.getmaxyx()
+    height = max(5, max_y - 3)
+    width = max(20, max_x - 2)
+    page_size = height - 3
+    search_win = curses.newwin(height, width, 3, 1)
+    search_win.bkgd(' ', curses.color_pair(6))
+    search_win.keypad(True)
+
+    query = ""
+    results = todo_manager.search_results(query)
+    cache = {query: results}  # Going back to an earlier query costs nothing
+    selection = 0
+    try:
+        while True:
+            start = selection - selection % page_size
+            search_win.erase()
+            search_win.box()
+            search_win.addstr(0, 2, f" Search: {query}_ "[:width - 4], curses.A_BOLD)
+            for y, (project, task) in enumerate(results.page(start, page_size)):
+                style = get_todo_style(task)
+                if start + y == selection:
+                    style |= curses.A_REVERSE
+                search_win.addstr(y + 1, 2, f"{project.name}: {format_todo_display(task)}"[:width - 4],
+                                  style)
+            pages = max(1, -(-results.count // page_size))
+            matches = f"{results.count} match" if results.count == 1 else f"{results.count} matches"
+            footer = (f" {matches}, page {start // page_size + 1}/{pages} | "
+                      "↑/↓ PgUp/PgDn Move | ENTER Go to todo | ESC Close ")
+            search_win.addstr(height - 1, 2, footer[:width - 4])
+            search_win.refresh()
+
+            typed = query
+            for key in read_keys(search_win) + [None]:
+                if key in (curses.KEY_BACKSPACE, '\x7f', '\x08'):
+                    typed = typed[:-1]
+                    continue
+                if isinstance(key, str) and key.isprintable():
+                    typed += key
+                    continue
+                if typed != query:
+                    # Search once for everything typed so far
+                    query = typed
+                    results = cache.get(query) or todo_manager.search_results(query, results)
+                    cache[query] = results
+                    selection = 0
+                if key in ('\n', '\r', curses.KEY_ENTER):
+                    if results.count:
+                        todo_manager.select_todo(*results.page(selection, 1)[0])
+                    return
+                elif key == '\x1b':
+                    return
+                elif key == curses.KEY_UP:
+                    selection = max(0, selection - 1)
+                elif key == curses.KEY_DOWN:
+                    selection = max(0, min(results.count - 1, selection + 1))
+                elif key == curses.KEY_PPAGE:
+                    selection = max(0, selection - page_size)
+                elif key == curses.KEY_NPAGE:
+                    selection = max(0, min(results.count - 1, selection + page_size))
+    except curses.error:
+        pass
+
+def show_agenda_window(stdscr, todo_manager, days: int = 7):
+    """List overdue, today's and upcoming todos across all projects.
+
+    ↑/↓ move through the todos and Enter selects one in its project; any
+    other key closes the window.
+    """
+    max_y, max_x = stdscr.getmaxyx()
+    height = max(5, max_y - 4)
+    width = max(20, max_x - 4)
+    rows = []  # (text, attr, (project, todo) or None for a heading)
+    for heading, entries in todo_manager.agenda(days):
+        rows.append((f"{heading} ({len(entries)})", curses.A_BOLD | curses.color_pair(4), None))
+        for project, task in entries:
+            rows.append((f"  {project.name}: {format_todo_display(task)}", get_todo_style(task),
+                         (project, task)))
+    selectable = [i for i, row in enumerate(rows) if row[2]]
+
+    agenda_win = curses.newwin(height, width, 2, 2)
+    agenda_win.bkgd(' ', curses.color_pair(6))
+    agenda_win.keypad(True)
+    view = Viewport(height - 3)
+    selection = 0
+    try:
+        while True:
+            agenda_win.erase()
+            agenda_win.box()
+            title = f"Agenda - next {days} days"
+            agenda_win.addstr(0, max(2, (width - len(title)) // 2), title,
+                              curses.A_BOLD | curses.color_pair(4))
+            current = selectable[selection] if selectable else 0
+            view.follow(current, len(rows))
+            if current and rows[current - 1][2] is None:
+                view.follow(current - 1, len(rows))  # Bring the section heading into view too
+            for y, i in enumerate(view.follow(view.offset, len(rows))):
+                text, style, entry = rows[i]
+                if selectable and i == current:
+                    style |= curses.A_REVERSE
+                agenda_win.addstr(y + 1, 2, text[:width - 4], style)
+            footer = "↑/↓ Move | ENTER Go to todo | any other key to close"
+            agenda_win.addstr(height - 2, max(2, (width - len(footer)) // 2), footer[:width - 4],
+                              curses.color_pair(8))
+            agenda_win.refresh()
+
+            key = agenda_win.getch()
+            if key == curses.KEY_UP:
+                selection = max(0, selection - 1)
+            elif key == curses.KEY_DOWN:
+                selection = min(len(selectable) - 1, selection + 1) if selectable else 0
+            elif key in (curses.KEY_ENTER, ord('\n'), ord('\r')) and selectable:
+                todo_manager.select_todo(*rows[current][2])
+                return
+            else:
+                return
+    except curses.error:
+        pass
+
+RECORD_FIELDS = ('project',) + Todo.FIELDS
+
+def open_records(path, mode):
+    if path == '-':
+        return sys.stdin if mode == 'r' else sys.stdout
+    return open(path, mode, newline='', encoding='utf-8')
+
+def read_todo_records(path, file_format='jsonl'):
+    """Stream todo records from a JSONL or CSV file ('-' reads stdin)"""
+    f = open_records(path, 'r')
+    try:
+        if file_format == 'csv':
+            for row in csv.DictReader(f):
+                record = {key: value for key, value in row.items() if value}
+                record['completed'] = record.get('completed', '').lower() in ('true', '1', 'yes', 'x')
+                record['categories'] = [c for c in record.get('categories', '').split(';') if c]
+                yield record
+        else:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
+def write_todo_records(path, records, file_format='jsonl') -> int:
+    """Stream todo records to a JSONL or CSV file ('-' writes stdout), returning how many"""
+    f = open_records(path, 'w')
+    count = 0
+    try:
+        if file_format == 'csv':
+            writer = csv.DictWriter(f, RECORD_FIELDS)
+            writer.writeheader()
+            for record in records:
+                record['categories'] = ';'.join(record['categories'])
+                writer.writerow(record)
+                count += 1
+        else:
+            for record in records:
+                f.write(json.dumps(record) + '\n')
+                count += 1
+    finally:
+        if f is not sys.stdout:
+            f.close()
+    return count
+
+def format_due_report(report, days: int = 7) -> str:
+    """Lay out TodoManager.due_report() as a table with a row per project and a total"""
+    labels = '/'.join(priority.label for priority in Priority)
+    totals = ([sum(counts) for counts in zip(*(row[1] for row in report))] or [0] * len(Priority),
+              [sum(counts) for counts in zip(*(row[2] for row in report))] or [0] * len(Priority))
+    rows = [(f"Overdue ({labels})", f"Next {days} days ({labels})", "Project")]
+    for name, overdue, due_soon in report + [("Total",) + totals]:
+        rows.append(tuple(f"{sum(counts)} ({'/'.join(map(str, counts))})"
+                          for counts in (overdue, due_soon)) + (name,))
+    widths = [max(len(row[i]) for row in rows) for i in range(2)]
+    return '\n'.join(f"{row[0]:<{widths[0]}}  {row[1]:<{widths[1]}}  {row[2]}" for row in rows)
+
+def draw_chrome(stdscr, project_win, todo_win):
+    """Draw the title, command line and pane borders"""
+    max_x = stdscr.getmaxyx()[1]
+    stdscr.clear()
+    project_win.clear()
+    todo_win.clear()
+
+    project_win.border()
+    todo_win.border()
+
+    stdscr.addstr(0, 0, "PROJECT MANAGER", curses.A_BOLD)
+    stdscr.addstr(1, 0, "=" * max_x)
+    commands = (" [?] Help | [TAB] Switch window | [a] + | [d] - | [e] Edit | "
+               "[space] Toggle | [p] Priority | [s] Sort | [h] Hide/Show | [q] Quit")
+    stdscr.addstr(2, 0, commands)
+
+def main(stdscr, storage=None, profile_startup=False):
+    """Run the UI; with profile_startup, return once the first frame is drawn"""
     curses.start_color()
     curses.curs_set(0)
     
-    todo = TodoManager()
+    todo = TodoManager(storage, load=False)
     todo.theme_manager.init_nord_theme()
     
     max_y, max_x = stdscr.getmaxyx()
@@ -649,61 +4132,144 @@ def main(stdscr):
     project_win.bkgd(' ', curses.color_pair(6))
     todo_win.bkgd(' ', curses.color_pair(6))    
 
-    while True:
-        stdscr.clear()
-        project_win.clear()
-        todo_win.clear()
+    # Rows inside the borders
+    project_view = Viewport(max_y-6)
+    todo_view = Viewport(max_y-6)
+    project_width = max_x//3 - 4
+    todo_width = (2*max_x//3) - 5
+    renderer = Renderer()
+
+    # Put the chrome on screen before anything is read from disk
+    renderer.begin_frame()
+    draw_chrome(stdscr, project_win, todo_win)
+    renderer.put(stdscr, max_y-1, 0, " Loading...", curses.A_REVERSE, max_x - 1)
+    renderer.flush(stdscr, project_win, todo_win)
+    startup_profile.mark('chrome')
+
+    def show_progress(done, total):
+        renderer.put(stdscr, max_y-1, 0, f" Loading... {done * 100 // total}%",
+                     curses.A_REVERSE, max_x - 1)
+        renderer.flush(stdscr, project_win, todo_win)
 
-        project_win.border()
-        todo_win.border()
+    todo.storage.progress = show_progress
+    todo.open_workspace()
+    todo.storage.progress = None
+    first_frame = True
+    # Keys that wait on a prompt or popup, which would swamp the input timings
+    prompt_keys = (ord('a'), ord('d'), ord('e'), ord('s'), ord('/'), ord('?'), ord('r'), ord('t'),
+                   ord('L'), ord('g'), ord('f'))
+    # Keys that edit the selected todo, which in a filter view is in some other project
+    todo_keys = (ord('a'), ord('d'), ord('e'), ord('p'), ord(' '))
+    key_start = None
 
-        stdscr.addstr(0, 0, "PROJECT MANAGER", curses.A_BOLD)
-        stdscr.addstr(1, 0, "=" * max_x)
-        commands = (" [?] Help | [TAB] Switch window | [a] + | [d] - | [e] Edit | "
-                   "[space] Toggle | [p] Priority | [s] Sort | [h] Hide/Show | [q] Quit")
-        stdscr.addstr(2, 0, commands)
+    while True:
+        frame_start = lap = time.perf_counter()
+        if todo.sync():
+            lap = latency_stats.lap('sync', lap)
+        render_cache.refresh_date()
+        if renderer.begin_frame():
+            draw_chrome(stdscr, project_win, todo_win)
+            lap = latency_stats.lap('render chrome', lap)
 
         # Draw project window
-        project_win.addstr(0, 2, "Projects")
-        for i, project in enumerate(todo.projects):
-            style = curses.A_REVERSE if i == todo.project_selection and todo.active_window == 'projects' else curses.A_NORMAL
-            project_win.addstr(i+1, 2, f"• {project.name}", style)
+        renderer.title(project_win, "Projects", project_width)
+        pane_rows = len(todo.projects) + len(todo.filters)  # Saved filters follow the projects
+        selected_row = todo.pane_row()
+        rows = project_view.follow(selected_row, pane_rows)
+        for y in range(project_view.height):
+            i = project_view.offset + y
+            text, style = "", curses.A_NORMAL
+            if i in rows:
+                if i < len(todo.projects):
+                    text = f"• {todo.projects[i].name}"
+                else:
+                    text = f"⌕ {todo.filters[i - len(todo.projects)][0]}"
+                if i == selected_row and todo.active_window == 'projects':
+                    style = curses.A_REVERSE
+            renderer.put(project_win, y + 1, 2, text, style, project_width)
+        project_view.draw_markers(project_win, pane_rows, renderer)
+        lap = latency_stats.lap('render projects', lap)
+        if first_frame:
+            # Show the project list while the selected project's todos load
+            renderer.flush(stdscr, project_win, todo_win)
+            startup_profile.mark('project list')
 
         # Draw todo window with safe header rendering
-        if not todo.projects:
-            todo_win.addstr(0, 2, "Todos - No Project")
+        visible_todos = []
+        results = None
+        if todo.view_filter is not None:
+            results = todo.filtered()
+            todo.todo_selection = min(todo.todo_selection, max(0, results.count - 1))
+            renderer.title(todo_win, f"Filter - {todo.filters[todo.view_filter][0]} "
+                                     f"({results.count} todos)", todo_width)
+        elif not todo.projects:
+            renderer.title(todo_win, "Todos - No Project", todo_width)
         else:
             visible_todos = todo.get_visible_todos()
-            completed_count = len([t for t in todo.projects[todo.project_selection].todos if t['completed']])
+            completed_count = todo.projects[todo.project_selection].completed_count
             total_count = len(todo.projects[todo.project_selection].todos)
             
             header = f"Todos - {todo.projects[todo.project_selection].name} ({completed_count}/{total_count} completed)"
             if not todo.show_completed:
                 header += " (hiding completed)"
-            todo_win.addstr(0, 2, header)
+            renderer.title(todo_win, header, todo_width)
 
-            for i, task in enumerate(visible_todos):
+        todo_count = results.count if results else len(visible_todos)
+        rows = todo_view.follow(todo.todo_selection, todo_count)
+        page = results.page(todo_view.offset, todo_view.height) if results else None
+        for y in range(todo_view.height):
+            i = todo_view.offset + y
+            text, style = "", curses.A_NORMAL
+            if i in rows:
+                if page:
+                    project, task = page[y]
+                    text = f"{project.name}: {format_todo_display(task)}"
+                else:
+                    task = visible_todos[i]
+                    text = format_todo_display(task)
                 style = get_todo_style(task)
                 if i == todo.todo_selection and todo.active_window == 'todos':
                     style |= curses.A_REVERSE
-                
-                display_str = format_todo_display(task)
-                try:
-                    todo_win.addstr(i+1, 2, display_str, style)
-                except curses.error:
-                    # Handle case where todo text is too long for window
-                    pass
+            renderer.put(todo_win, y + 1, 2, text, style, todo_width)
+        todo_view.draw_markers(todo_win, todo_count, renderer)
+        lap = latency_stats.lap('render todos', lap)
 
-        stdscr.refresh()
-        project_win.refresh()
-        todo_win.refresh()
-        
-        draw_status_bar(stdscr, todo)
+        draw_status_bar(stdscr, todo, renderer)
+        lap = latency_stats.lap('render status', lap)
+        renderer.flush(stdscr, project_win, todo_win)
+        latency_stats.lap('render flush', lap)
+        latency_stats.lap('frame', frame_start)
+        if key_start is not None:
+            latency_stats.lap('keystroke', key_start)  # From the key arriving to its frame on screen
+        if first_frame:
+            first_frame = False
+            startup_profile.mark('first frame')
+            startup_profile.finish()
+            if profile_startup:
+                todo.close()
+                break
+        # Wake up now and then to show what other sessions changed
+        stdscr.timeout(1000)
         key = stdscr.getch()
+        stdscr.timeout(-1)
+        if key == -1:
+            key_start = None
+            continue
+        key_start = time.perf_counter()
+
+        if key in prompt_keys or key == curses.KEY_RESIZE:
+            renderer.invalidate()  # Prompts, popups and theme changes draw over the panes
+
+        view = None
+        if todo.view_filter is not None and todo.active_window == 'todos' and key in todo_keys:
+            if not todo.filtered().count:
+                continue
+            view = todo.focus_filtered()  # Edit the todo in its own project, then come back
 
         if key == ord('h'):
             todo.toggle_completed_visibility()
         elif key == ord('q'):
+            todo.close()
             break
         elif key == ord('\t'):
             todo.active_window = 'todos' if todo.active_window == 'projects' else 'projects'
@@ -744,7 +4310,9 @@ def main(stdscr):
             curses.noecho()
             curses.curs_set(0)
         elif key == ord('d'):
-            if todo.active_window == 'projects':
+            if todo.active_window == 'projects' and todo.view_filter is not None:
+                todo.remove_filter(todo.view_filter)
+            elif todo.active_window == 'projects':
                 todo.delete_project(stdscr)
             else:
                 todo.delete_todo()
@@ -757,15 +4325,21 @@ def main(stdscr):
             show_help_window(stdscr, todo)
         elif key == curses.KEY_UP:
             if todo.active_window == 'projects':
-                todo.project_selection = max(0, todo.project_selection - 1)
+                todo.select_pane_row(todo.pane_row() - 1)
             else:
                 todo.todo_selection = max(0, todo.todo_selection - 1)
         elif key == curses.KEY_DOWN:
             if todo.active_window == 'projects':
-                todo.project_selection = min(len(todo.projects) - 1, todo.project_selection + 1)
+                todo.select_pane_row(todo.pane_row() + 1)
+            elif todo.view_filter is not None:
+                todo.todo_selection = min(todo.filtered().count - 1, todo.todo_selection + 1)
             else:
                 visible_todos = todo.get_visible_todos()
                 todo.todo_selection = min(len(visible_todos) - 1, todo.todo_selection + 1)
+        elif key in (curses.KEY_ENTER, ord('\n'), ord('\r')) and todo.view_filter is not None:
+            results = todo.filtered()
+            if todo.active_window == 'todos' and results.count:
+                todo.select_todo(*results.page(todo.todo_selection, 1)[0])  # Go to its project
         elif key == ord('e') and todo.active_window == 'todos':
             if todo.projects and todo.projects[todo.project_selection].todos:
                 curses.echo()
@@ -794,9 +4368,9 @@ def main(stdscr):
                     new_priority = 'low'
                 
                 if new_desc or new_date_str or new_priority:
-                    new_date = parse_due_date(new_date_str) if new_date_str else current_todo.get('due_date')
+                    new_date = parse_due_date(new_date_str) if new_date_str else current_todo.due_date
                     todo.edit_todo(
-                        new_description=new_desc if new_desc else current_todo['description'],
+                        new_description=new_desc if new_desc else current_todo.description,
                         new_due_date=new_date,
                         new_priority=new_priority
                     )
@@ -813,66 +4387,15 @@ def main(stdscr):
                 todo.toggle_sort('due_date')
             elif sort_key == ord('p'):
                 todo.toggle_sort('priority')   
-        elif key == ord('/'):  # Add search functionality
-            curses.echo()
-            curses.curs_set(1)
-            max_y, max_x = stdscr.getmaxyx()
-            stdscr.addstr(max_y-2, 0, "Search: ")
-            stdscr.clrtoeol()
-            query = stdscr.getstr().decode('utf-8')
-            
-            if query:
-                results = todo.search_todos(query)
-                if results:
-                    # Create search results window
-                    search_win = curses.newwin(max_y-3, max_x-2, 3, 1)
-                    search_win.box()
-                    search_win.addstr(0, 2, f"Search Results for '{query}'")
-                    
-                    for i, (project_name, task) in enumerate(results, 1):
-                        if i >= max_y-5:  # Prevent overflow
-                            break
-                        display_str = f"{project_name}: {format_todo_display(task)}"
-                        search_win.addstr(i, 2, display_str, get_todo_style(task))
-                    
-                    search_win.refresh()
-                    search_win.getch()
-            
-            curses.noecho()
-            curses.curs_set(0)
+        elif key == ord('/'):  # Search as you type
+            show_search_window(stdscr, todo)
         elif key == ord('t'):
             todo.theme_manager.toggle_theme()
         elif key == ord('u'):  # Undo
-            current_state = {
-                'projects': [{
-                    'name': p.name,
-                    'todos': copy.deepcopy(p.todos),
-                    'sort_by': p.sort_by,
-                    'sort_reverse': p.sort_reverse,
-                    'categories': list(p.categories)
-                } for p in todo.projects],
-                'project_selection': todo.project_selection,
-                'todo_selection': todo.todo_selection,
-                'show_completed': todo.show_completed
-            }
-            if todo.restore_state(todo.undo_manager.undo(current_state)):
-                todo.save_data()
+            todo.undo()
                 
         elif key == 18:  # Ctrl+R for Redo
-            current_state = {
-                'projects': [{
-                    'name': p.name,
-                    'todos': copy.deepcopy(p.todos),
-                    'sort_by': p.sort_by,
-                    'sort_reverse': p.sort_reverse,
-                    'categories': list(p.categories)
-                } for p in todo.projects],
-                'project_selection': todo.project_selection,
-                'todo_selection': todo.todo_selection,
-                'show_completed': todo.show_completed
-            }
-            if todo.restore_state(todo.undo_manager.redo(current_state)):
-                todo.save_data()
+            todo.redo()
         elif key == ord('r'):  # Restore backup functionality
             if todo.active_window == 'projects':
                 backups = todo.list_backups()
@@ -895,6 +4418,144 @@ def main(stdscr):
                     curses.curs_set(0)
         elif key == ord('?'):
             show_help_window(stdscr, todo)
+        elif key == ord('L'):
+            show_latency_window(stdscr)
+        elif key == ord('g'):
+            show_agenda_window(stdscr, todo)
+        elif key == ord('f'):  # Save a filter, listed after the projects
+            curses.echo()
+            curses.curs_set(1)
+            stdscr.addstr(max_y-2, 0, 'Filter (e.g. p:high due<today cat:work -done "some words"): ')
+            stdscr.clrtoeol()
+            text = stdscr.getstr().decode('utf-8').strip()
+            if text:
+                stdscr.addstr(max_y-1, 0, "Filter name (leave empty to use the filter): ")
+                stdscr.clrtoeol()
+                name = stdscr.getstr().decode('utf-8').strip() or text
+                try:
+                    todo.add_filter(name, text)
+                    todo.select_pane_row(len(todo.projects) + len(todo.filters) - 1)
+                except ValueError as e:
+                    stdscr.addstr(max_y-1, 0, f"{e} - press any key")
+                    stdscr.clrtoeol()
+                    stdscr.getch()
+            curses.noecho()
+            curses.curs_set(0)
+
+        if view is not None:
+            todo.restore_view(view)
+        if key in prompt_keys:
+            key_start = None
+        else:
+            latency_stats.lap('input', key_start)
 
 if __name__ == "__main__":
-    curses.wrapper(main)
+    parser = argparse.ArgumentParser(description="Terminal project manager and todo list")
+    parser.add_argument('--storage', choices=['json', 'sqlite', 'shards'], default='json',
+                        help="store projects in projects.json, in todo.db or in the projects directory")
+    parser.add_argument('--migrate', action='store_true',
+                        help="copy projects.json into todo.db (or the projects directory "
+                             "with --storage shards) and exit")
+    parser.add_argument('--import', dest='import_file', metavar='FILE',
+                        help="add the todos in a JSONL or CSV file ('-' for stdin) and exit")
+    parser.add_argument('--export', dest='export_file', metavar='FILE',
+                        help="write every todo to a JSONL or CSV file ('-' for stdout) and exit")
+    parser.add_argument('--format', choices=['jsonl', 'csv'],
+                        help="file format for --import/--export (default: from the file name)")
+    parser.add_argument('--project', help="project for imported todos that do not name one, "
+                                          "or the only project --report counts")
+    parser.add_argument('--report', type=int, nargs='?', const=7, metavar='DAYS',
+                        help="print the pending todos overdue and due in the next DAYS "
+                             "(default: 7) per project and priority, and exit")
+    parser.add_argument('--write-delay', type=float, default=0.5, metavar='SECONDS',
+                        help="wait for this long a pause in edits before writing them (default: 0.5)")
+    parser.add_argument('--latency-log', metavar='FILE',
+                        help="on exit, write the latency of each operation and render phase "
+                             "to FILE as JSON")
+    parser.add_argument('--startup-profile', action='store_true',
+                        help="exit after drawing the first frame and print how long each "
+                             "startup phase took")
+    parser.add_argument('--serve', action='store_true',
+                        help="hold the workspace in memory and serve it to --connect sessions "
+                             "over a Unix socket")
+    parser.add_argument('--connect', action='store_true',
+                        help="work on the workspace of a running --serve instead of the files")
+    parser.add_argument('--socket', default='todo.sock', metavar='PATH',
+                        help="socket for --serve and --connect (default: todo.sock)")
+    startup_profile.mark('import')
+    args = parser.parse_args()
+    if args.migrate:
+        if args.storage == 'shards':
+            projects = migrate_json(ShardedStorage())
+            print(f"Migrated {len(projects)} projects to the projects directory")
+        else:
+            projects = migrate_json_to_sqlite()
+            print(f"Migrated {len(projects)} projects to todo.db")
+        sys.exit()
+
+    if args.connect and args.report is not None:
+        client = TodoClient(args.socket)
+        print(format_due_report(client.call('due_report', args.report, args.project),
+                                args.report))
+        client.close()
+        sys.exit()
+
+    if args.connect and (args.import_file or args.export_file):
+        # Run the import or export in the server rather than copying the workspace here
+        path = args.import_file or args.export_file
+        file_format = args.format or ('csv' if path.lower().endswith('.csv') else 'jsonl')
+        client = TodoClient(args.socket)
+        if args.import_file:
+            count = client.call('import_todos', list(read_todo_records(path, file_format)),
+                                args.project)
+            print(f"Imported {count} todos", file=sys.stderr)
+        else:
+            count = write_todo_records(path, client.call('export_todos'), file_format)
+            print(f"Exported {count} todos", file=sys.stderr)
+        client.close()
+        sys.exit()
+
+    if args.connect:
+        storage = RemoteStorage(args.socket)
+    elif args.storage == 'sqlite':
+        storage = SqliteStorage()
+    elif args.storage == 'shards':
+        storage = ShardedStorage()
+    else:
+        storage = JsonStorage()
+    if args.report is not None:
+        todo = TodoManager(storage)
+        print(format_due_report(todo.due_report(args.report, args.project), args.report))
+        todo.close()
+    elif args.import_file or args.export_file:
+        path = args.import_file or args.export_file
+        file_format = args.format or ('csv' if path.lower().endswith('.csv') else 'jsonl')
+        todo = TodoManager(storage)
+        if args.import_file:
+            try:
+                count = todo.import_todos(read_todo_records(path, file_format), args.project)
+            except ValueError as e:
+                todo.close()
+                sys.exit(f"Nothing imported: {e}")
+            print(f"Imported {count} todos", file=sys.stderr)
+        else:
+            count = write_todo_records(path, todo.export_todos(), file_format)
+            print(f"Exported {count} todos", file=sys.stderr)
+        todo.close()
+    elif args.serve:
+        print(f"Serving the workspace on {args.socket}", file=sys.stderr)
+        TodoServer(storage, args.socket).run()
+    else:
+        if not args.connect:
+            storage = BackgroundWriter(storage, args.write_delay)
+        # Leave through SystemExit so queued writes are flushed below
+        for signum in (signal.SIGTERM, signal.SIGHUP):
+            signal.signal(signum, lambda signum, frame: sys.exit(128 + signum))
+        try:
+            curses.wrapper(main, storage, args.startup_profile)
+        finally:
+            storage.close()
+            if args.latency_log:
+                latency_stats.export(args.latency_log)
+        if args.startup_profile:
+            print(startup_profile.report(), file=sys.stderr)